@@ -0,0 +1,141 @@
+import threading
+
+from flask import jsonify, render_template_string, request
+
+from cai import MAX_RANKED_GENES, CodonAdaptation
+from differential import MAX_DIFFERENTIAL_GENES, SORT_KEYS, UsageProfile, differential_usage
+from similarity import METRICS, SIMILARITY_TEMPLATE, SimilarityCache
+from top_k_query import top_cai
+
+
+class SampleAnalysis:
+    """Usage profiles, CAI scores and the similarity matrix of one view's samples.
+
+    with_matrix(sample_name, build) calls build with the sample's
+    CodonMatrix and returns its result, holding off anything that changes
+    the matrix meanwhile; codon_totals(sample_name) returns the sample's
+    genome-wide codon counts. Profiles and scores are built on first use
+    and kept in the view's SampleView. invalidate drops a sample's, and
+    ones still being built for an earlier generation of it are not kept.
+    """
+
+    def __init__(self, view, with_matrix, codon_totals):
+        self.profiles = view.profiles
+        self.adaptations = view.adaptations
+        self.similarity = SimilarityCache()
+        self.codon_totals = codon_totals
+        self._with_matrix = with_matrix
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, cache, sample_name, build):
+        with self._lock:
+            value = cache.get(sample_name)
+            generation = self._generations.get(sample_name, 0)
+        if value is None:
+            value = self._with_matrix(sample_name, build)
+            with self._lock:
+                if self._generations.get(sample_name, 0) == generation:
+                    cache[sample_name] = value
+        return value
+
+    def profile(self, sample_name):
+        return self._cached(self.profiles, sample_name, UsageProfile)
+
+    def adaptation(self, sample_name):
+        return self._cached(self.adaptations, sample_name, CodonAdaptation)
+
+    def invalidate(self, sample_name):
+        with self._lock:
+            self._generations[sample_name] = self._generations.get(sample_name, 0) + 1
+            self.profiles.pop(sample_name, None)
+            self.adaptations.pop(sample_name, None)
+        self.similarity.invalidate(sample_name)
+
+
+def _requested_samples(processed_data, data_lock):
+    # (sample names, None) from the samples argument, or every loaded sample; (None, error response) if unknown
+    with data_lock:
+        samples = list(processed_data)
+    if request.args.get("samples"):
+        names = request.args["samples"].split(",")
+        missing = [name for name in names if name not in samples]
+        if missing:
+            return None, (jsonify({"error": f"Samples not found: {', '.join(missing)}"}), 404)
+        samples = names
+    return samples, None
+
+
+def register_analysis_routes(bp, analysis, processed_data, data_lock):
+    """Add the differential, similarity and CAI routes of a view to its blueprint."""
+
+    @bp.route("/api/differential")
+    def api_differential():
+        # e.g. /api/differential?sample1=P42_Brain_Ribo_rep1&sample2=P42_Heart_Ribo_rep1&limit=50&sort=divergence
+        sample1 = request.args.get("sample1")
+        sample2 = request.args.get("sample2")
+        if not sample1 or not sample2:
+            return jsonify({"error": "sample1 and sample2 are required"}), 400
+        try:
+            limit = int(request.args.get("limit", 50))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        if not 0 < limit <= MAX_DIFFERENTIAL_GENES:
+            return jsonify({"error": f"limit must be between 1 and {MAX_DIFFERENTIAL_GENES}"}), 400
+        sort = request.args.get("sort", "divergence")
+        if sort not in SORT_KEYS:
+            return jsonify({"error": f"sort must be one of {', '.join(SORT_KEYS)}"}), 400
+
+        with data_lock:
+            missing = [name for name in (sample1, sample2) if name not in processed_data]
+        if missing:
+            return jsonify({"error": f"Samples not found: {', '.join(missing)}"}), 404
+
+        result = differential_usage(analysis.profile(sample1), analysis.profile(sample2), limit, sort)
+        return jsonify({"sample1": sample1, "sample2": sample2, "sort": sort, **result})
+
+    @bp.route("/similarity")
+    def similarity():
+        metric = request.args.get("metric", "js_divergence")
+        if metric not in METRICS:
+            return f"metric must be one of {', '.join(METRICS)}", 400
+        return render_template_string(SIMILARITY_TEMPLATE, metrics=METRICS, metric=metric)
+
+    @bp.route("/api/similarity")
+    def api_similarity():
+        # e.g. /api/similarity?metric=correlation&samples=P42_Brain_Ribo_rep1,P42_Brain_Ribo_rep2
+        metric = request.args.get("metric", "js_divergence")
+        if metric not in METRICS:
+            return jsonify({"error": f"metric must be one of {', '.join(METRICS)}"}), 400
+        samples, error = _requested_samples(processed_data, data_lock)
+        if error is not None:
+            return error
+
+        matrix = analysis.similarity.matrix(samples, metric, analysis.codon_totals)
+        return jsonify({"metric": metric, "distance": METRICS[metric], "samples": samples, "matrix": matrix.tolist()})
+
+    @bp.route("/api/cai")
+    def api_cai():
+        # e.g. /api/cai?k=20&lowest=true&samples=P42_Brain_Ribo_rep1,P42_Heart_Ribo_rep1, or &gene=Xkr4 for one gene
+        try:
+            k = int(request.args.get("k", 20))
+        except ValueError:
+            return jsonify({"error": "k must be an integer"}), 400
+        if not 0 < k <= MAX_RANKED_GENES:
+            return jsonify({"error": f"k must be between 1 and {MAX_RANKED_GENES}"}), 400
+        lowest = request.args.get("lowest", "false").lower() in ("1", "true", "yes")
+        gene_name = request.args.get("gene") or None
+        samples, error = _requested_samples(processed_data, data_lock)
+        if error is not None:
+            return error
+
+        adaptations = {sample_name: analysis.adaptation(sample_name) for sample_name in samples}
+        if gene_name is not None:
+            genes = {sample_name: adaptation.gene(gene_name) for sample_name, adaptation in adaptations.items()}
+            return jsonify({"gene": gene_name, "samples": {name: gene for name, gene in genes.items() if gene is not None}})
+        return jsonify({
+            "k": k,
+            "lowest": lowest,
+            "results": top_cai(adaptations, k, lowest),
+            "samples": {sample_name: adaptation.summary() for sample_name, adaptation in adaptations.items()},
+        })
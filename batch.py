@@ -0,0 +1,154 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import hash_map
+import max_heap
+from parallel import sample_name_for
+from readers import is_input_file
+
+# engine -> (process_file returning (output rows, elapsed seconds), columns of its output rows)
+ENGINES = {
+    'hash_map': (hash_map.process_file, ['gene_name', 'amino_acid', 'optimal_codon', 'codon', 'usage_rate']),
+    'max_heap': (max_heap.process_file, ['gene_name', 'amino_acid', 'optimal_codon', 'usage_rate']),
+}
+
+# table of every sample's rows, written next to the per-sample tables
+COMBINED_FILE = "optimal_codons.csv"
+
+
+def find_input_files(inputs):
+    """Input files named by inputs: files, directories or glob patterns, without repeats.
+
+    Directories contribute their CSV, FASTA and FASTQ files, gzipped or not.
+    """
+    csv_files = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = sorted(path for path in glob.glob(os.path.join(pattern, '*')) if is_input_file(path))
+        elif os.path.exists(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(glob.glob(pattern))
+        csv_files.extend(matches)
+    return list(dict.fromkeys(csv_files))
+
+
+def duplicate_sample_names(csv_files):
+    """{sample name: files} of the sample names more than one of csv_files would be written to."""
+    files = {}
+    for filename in csv_files:
+        files.setdefault(sample_name_for(filename), []).append(filename)
+    return {sample_name: names for sample_name, names in files.items() if len(names) > 1}
+
+
+def write_sample(engine, filename, output_folder):
+    # process one file and write its table from the worker, so rows are never shipped back
+    process_file, fieldnames = ENGINES[engine]
+    output_data, elapsed_time = process_file(filename)
+    path = os.path.join(output_folder, f"{sample_name_for(filename)}.csv")
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(output_data)
+    return path, len(output_data), elapsed_time
+
+
+def run_batch(csv_files, engine='max_heap', output_folder="output_csvs", max_workers=None,
+              combined_file=COMBINED_FILE):
+    """Write one optimal-codon table per sample and a combined table with a sample_name column.
+
+    Files are processed on a pool of max_workers processes (1 runs them in
+    this process). The combined table is streamed from the per-sample
+    tables in input order as they become available, so neither the parent
+    nor any worker holds more than one sample's rows. Returns the names of
+    the samples that failed. Raises ValueError if two files share a sample
+    name, or one is named like the combined table, since their tables
+    would overwrite each other.
+    """
+    duplicates = duplicate_sample_names(csv_files)
+    if duplicates:
+        raise ValueError("inputs share sample names: " + "; ".join(
+            f"{sample_name} ({', '.join(files)})" for sample_name, files in duplicates.items()
+        ))
+    clashing = [filename for filename in csv_files if f"{sample_name_for(filename)}.csv" == combined_file]
+    if clashing:
+        raise ValueError(f"{', '.join(clashing)} would be written over the combined table {combined_file}")
+    os.makedirs(output_folder, exist_ok=True)
+    fieldnames = ENGINES[engine][1]
+    failed = []
+    start_time = time.time()
+
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers != 1 else None
+    try:
+        if executor is None:
+            results = (_call(write_sample, engine, filename, output_folder) for filename in csv_files)
+        else:
+            futures = [executor.submit(write_sample, engine, filename, output_folder) for filename in csv_files]
+            results = (_result(future) for future in futures)
+
+        with open(os.path.join(output_folder, combined_file), 'w', newline='', encoding='utf-8') as combined:
+            writer = csv.writer(combined)
+            writer.writerow(['sample_name'] + fieldnames)
+            for filename, (result, error) in zip(csv_files, results):
+                sample_name = sample_name_for(filename)
+                if error is not None:
+                    failed.append(sample_name)
+                    print(f"Error processing {filename}: {error}")
+                    continue
+                path, rows, elapsed_time = result
+                with open(path, newline='', encoding='utf-8') as file:
+                    reader = csv.reader(file)
+                    next(reader, None)
+                    writer.writerows([sample_name] + row for row in reader)
+                print(f"Completed processing {sample_name} in {elapsed_time:.2f} seconds ({rows} rows)")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(f"{len(csv_files) - len(failed)} of {len(csv_files)} samples written to '{output_folder}' "
+          f"in {time.time() - start_time:.2f} seconds")
+    return failed
+
+
+def _call(function, *args):
+    try:
+        return function(*args), None
+    except Exception as e:
+        return None, e
+
+
+def _result(future):
+    try:
+        return future.result(), None
+    except Exception as e:
+        return None, e
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write optimal-codon tables for samples without the web apps.")
+    parser.add_argument('inputs', nargs='+',
+                        help="input files (CSV, FASTA or FASTQ, optionally gzipped), directories or glob patterns")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='max_heap')
+    parser.add_argument('--output', default="output_csvs", help="folder for the per-sample and combined tables")
+    parser.add_argument('--combined', default=COMBINED_FILE, help="name of the combined table in the output folder")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 1 processes the files one by one")
+    args = parser.parse_args()
+
+    csv_files = find_input_files(args.inputs)
+    if not csv_files:
+        parser.error("no input files found")
+    try:
+        failed = run_batch(csv_files, args.engine, args.output, args.workers, args.combined)
+    except ValueError as e:
+        parser.error(str(e))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import argparse
+import csv
+import heapq
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+
+from hash_map import CODON_TABLE, HashMap, CodonHashMap, iter_csv_chunks, process_gene_data
+import dual_pipeline
+import max_heap
+from max_heap import MaxHeap
+
+CODONS = list(CODON_TABLE)
+SENSE_CODONS = [codon for codon in CODONS if CODON_TABLE[codon] != '*']
+
+
+def generate_csv(path, genes=1000, rows_per_gene=20, sequence_length=300, n_rate=0.001, seed=0):
+    """Write a synthetic ribo-seq CSV with gene_name and sequence columns.
+
+    Every gene gets its own codon preference, drawn from a Dirichlet
+    distribution, so usage rates and optimal codons differ between genes.
+    Row counts per gene vary around rows_per_gene, and sequence lengths
+    around sequence_length bases (a multiple of 3 plus ragged tails).
+    Bases are replaced by N with probability n_rate. Rows are shuffled,
+    so a gene's reads are spread over the file as in real data.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for gene in range(genes):
+        weights = [rng.gammavariate(0.5, 1.0) for _ in SENSE_CODONS]
+        reads = max(1, int(rng.expovariate(1 / rows_per_gene)))
+        for _ in range(reads):
+            codon_count = max(1, int(rng.gauss(sequence_length / 3, sequence_length / 12)))
+            sequence = ''.join(rng.choices(SENSE_CODONS, weights, k=codon_count))
+            sequence += ''.join(rng.choices('ACGT', k=rng.randrange(3)))
+            if n_rate:
+                sequence = ''.join('N' if rng.random() < n_rate else base for base in sequence)
+            rows.append((f"GENE{gene:05d}", sequence))
+    rng.shuffle(rows)
+
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['gene_name', 'sequence'])
+        writer.writerows(rows)
+    return len(rows)
+
+
+def measure(function, repeat):
+    """Run function repeat times; return the wall-clock seconds of each run."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def summarize(seconds, items=None):
+    result = {
+        'seconds': seconds,
+        'min': min(seconds),
+        'median': statistics.median(seconds),
+    }
+    if items:
+        result['items'] = items
+        result['items_per_second'] = items / min(seconds)
+    return result
+
+
+def bench_hash_map(size, repeat):
+    keys = [f"GENE{i:06d}" for i in range(size)]
+
+    def run_hash_map():
+        table = HashMap()
+        for key in keys:
+            table.increment(key)
+        for key in keys:
+            table.get(key)
+
+    def run_dict():
+        table = {}
+        for key in keys:
+            table[key] = table.get(key, 0) + 1
+        for key in keys:
+            table.get(key)
+
+    return {
+        'HashMap': summarize(measure(run_hash_map, repeat), size),
+        'dict': summarize(measure(run_dict, repeat), size),
+    }
+
+
+def bench_max_heap(size, repeat, seed=0):
+    rng = random.Random(seed)
+    items = [(f"K{i}", rng.random()) for i in range(size)]
+
+    def run_max_heap():
+        heap = MaxHeap(items)
+        while not heap.is_empty():
+            heap.extract_max()
+
+    def run_max_heap_insert():
+        heap = MaxHeap()
+        for key, value in items:
+            heap.insert(key, value)
+        while not heap.is_empty():
+            heap.extract_max()
+
+    def run_heapq():
+        heap = [(-value, order, key) for order, (key, value) in enumerate(items)]
+        heapq.heapify(heap)
+        while heap:
+            heapq.heappop(heap)
+
+    return {
+        'MaxHeap.heapify': summarize(measure(run_max_heap, repeat), size),
+        'MaxHeap.insert': summarize(measure(run_max_heap_insert, repeat), size),
+        'heapq': summarize(measure(run_heapq, repeat), size),
+    }
+
+
+def bench_process_gene_data(path, rows, repeat):
+    def run():
+        codon_map = CodonHashMap()
+        gene_counts = HashMap()
+        for chunk in iter_csv_chunks(path):
+            process_gene_data(chunk, codon_map, gene_counts)
+
+    return summarize(measure(run, repeat), rows)
+
+
+def bench_max_heap_process_file(path, rows, repeat):
+    return summarize(measure(lambda: max_heap.process_file(path), repeat), rows)
+
+
+def bench_dual_process_file(path, rows, repeat):
+    return summarize(measure(lambda: dual_pipeline.process_file(path), repeat), rows)
+
+
+def run_benchmarks(genes=1000, rows_per_gene=20, sequence_length=300, n_rate=0.001,
+                   structure_size=100000, repeat=3, seed=0, csv_path=None):
+    """Run every benchmark and return the results as a JSON-serializable dict."""
+    config = {
+        'genes': genes,
+        'rows_per_gene': rows_per_gene,
+        'sequence_length': sequence_length,
+        'n_rate': n_rate,
+        'structure_size': structure_size,
+        'repeat': repeat,
+        'seed': seed,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        path = csv_path or os.path.join(directory, 'synthetic.csv')
+        if csv_path and os.path.exists(csv_path):
+            with open(csv_path, encoding='utf-8') as file:
+                rows = sum(1 for _ in file) - 1
+        else:
+            rows = generate_csv(path, genes, rows_per_gene, sequence_length, n_rate, seed)
+        config['rows'] = rows
+
+        results = {
+            'hash_map_vs_dict': bench_hash_map(structure_size, repeat),
+            'max_heap_vs_heapq': bench_max_heap(structure_size, repeat, seed),
+            'process_gene_data': bench_process_gene_data(path, rows, repeat),
+            'max_heap_process_file': bench_max_heap_process_file(path, rows, repeat),
+            'dual_process_file': bench_dual_process_file(path, rows, repeat),
+        }
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the codon usage pipelines on synthetic data.")
+    parser.add_argument('--genes', type=int, default=1000)
+    parser.add_argument('--rows-per-gene', type=int, default=20)
+    parser.add_argument('--sequence-length', type=int, default=300)
+    parser.add_argument('--n-rate', type=float, default=0.001)
+    parser.add_argument('--structure-size', type=int, default=100000,
+                        help="keys used for the HashMap and MaxHeap micro-benchmarks")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--csv', help="benchmark this CSV (generated first if it does not exist)")
+    parser.add_argument('--generate-only', action='store_true', help="only write the synthetic CSV given by --csv")
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    if args.generate_only:
+        if not args.csv:
+            parser.error("--generate-only needs --csv")
+        rows = generate_csv(args.csv, args.genes, args.rows_per_gene, args.sequence_length, args.n_rate, args.seed)
+        print(f"Wrote {rows} rows to {args.csv}")
+        return
+
+    report = run_benchmarks(args.genes, args.rows_per_gene, args.sequence_length, args.n_rate,
+                            args.structure_size, args.repeat, args.seed, args.csv)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+
+    for group, result in report['results'].items():
+        entries = result.items() if 'min' not in result else [(group, result)]
+        for name, entry in entries:
+            print(f"{name:28s} {entry['min']:8.3f}s")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
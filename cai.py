@@ -0,0 +1,119 @@
+import numpy as np
+
+from codon_index import CODONS
+from codon_matrix import AMINO_ACIDS, AMINO_ACID_CODONS, CODON_AMINO_ACID
+from differential import AMINO_ACID_ONEHOT
+
+# synonymous codons of each codon's amino acid
+SYNONYMS = np.array([len(AMINO_ACID_CODONS[group]) for group in CODON_AMINO_ACID])
+
+# codons scored by CAI: stop codons and single-codon amino acids (Met, Trp) offer no choice
+INFORMATIVE = (SYNONYMS > 1) & (CODON_AMINO_ACID != AMINO_ACIDS.index('*'))
+
+# count given to a codon never seen genome-wide, so its weight is small rather than zero
+PSEUDOCOUNT = 0.5
+
+# most genes returned by one CAI ranking
+MAX_RANKED_GENES = 10000
+
+
+def rscu(counts):
+    """Relative synonymous codon usage of codon counts (..., 64).
+
+    A codon's count over the count expected if its amino acid's codons
+    were used equally; 1 is unbiased usage, 0 where the amino acid is absent.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = (counts @ AMINO_ACID_ONEHOT)[..., CODON_AMINO_ACID]
+    result = np.zeros(counts.shape)
+    np.divide(counts * SYNONYMS, totals, out=result, where=totals > 0)
+    return result
+
+
+def relative_adaptiveness(genome_totals):
+    """CAI weight of every codon from genome-wide codon totals, shape (64,).
+
+    Each codon's count over that of its amino acid's most used codon, so
+    the genome-wide optimal codons weigh 1. NaN for codons CAI does not
+    score and for amino acids never seen.
+    """
+    genome_totals = np.asarray(genome_totals, dtype=np.float64)
+    present = (genome_totals @ AMINO_ACID_ONEHOT)[CODON_AMINO_ACID] > 0
+    counts = np.where(present & (genome_totals == 0), PSEUDOCOUNT, genome_totals)
+    best = np.zeros(len(AMINO_ACIDS))
+    np.maximum.at(best, CODON_AMINO_ACID, counts)
+    weights = np.full(len(CODONS), np.nan)
+    scored = INFORMATIVE & present
+    weights[scored] = counts[scored] / best[CODON_AMINO_ACID[scored]]
+    return weights
+
+
+def codon_adaptation_index(counts, weights):
+    """CAI of every row of codon counts (genes, 64) in one matrix product.
+
+    The geometric mean of the weights of a gene's codons, each codon
+    counted as often as it occurs; NaN for genes without scored codons.
+    """
+    scored = ~np.isnan(weights)
+    counts = counts[:, scored]
+    totals = counts.sum(axis=1)
+    log_mean = np.full(len(counts), np.nan)
+    np.divide(counts @ np.log(weights[scored]), totals, out=log_mean, where=totals > 0)
+    return np.exp(log_mean)
+
+
+class CodonAdaptation:
+    """CAI and RSCU of every gene of one sample against the sample's own genome.
+
+    Reference weights come from CodonMatrix.genome_codon_totals, the totals
+    aggregate_optimality ranks, so each amino acid's genome-wide optimal
+    codon has weight 1. The arrays are copies, like UsageProfile's.
+    """
+
+    def __init__(self, matrix):
+        self.gene_names = list(matrix.gene_names)
+        self.gene_index = dict(matrix.gene_index)
+        genome_totals = matrix.genome_codon_totals()
+        self.genome_rscu = rscu(genome_totals)
+        self.weights = relative_adaptiveness(genome_totals)
+        self.counts = matrix.counts.copy()
+        self.rscu = rscu(self.counts)
+        self.cai = codon_adaptation_index(self.counts, self.weights)
+
+    def summary(self):
+        """Scored gene count, mean CAI and the reference RSCU and weight of every scored codon."""
+        scored = self.cai[~np.isnan(self.cai)]
+        return {
+            'genes': len(scored),
+            'mean_cai': float(scored.mean()) if len(scored) else None,
+            'reference': [
+                {
+                    'amino_acid': AMINO_ACIDS[CODON_AMINO_ACID[codon]],
+                    'codon': CODONS[codon],
+                    'rscu': float(self.genome_rscu[codon]),
+                    'weight': float(self.weights[codon]),
+                }
+                for codon in np.flatnonzero(~np.isnan(self.weights)).tolist()
+            ],
+        }
+
+    def gene(self, gene_name):
+        """CAI of one gene and the RSCU of every codon it uses, or None if the gene is unknown."""
+        row = self.gene_index.get(gene_name)
+        if row is None:
+            return None
+        score = self.cai[row]
+        return {
+            'gene_name': gene_name,
+            'cai': None if np.isnan(score) else float(score),
+            'codons': [
+                {
+                    'amino_acid': AMINO_ACIDS[CODON_AMINO_ACID[codon]],
+                    'codon': CODONS[codon],
+                    'count': int(self.counts[row, codon]),
+                    'rscu': float(self.rscu[row, codon]),
+                    'weight': None if np.isnan(self.weights[codon]) else float(self.weights[codon]),
+                }
+                for codon in np.flatnonzero(self.counts[row]).tolist()
+            ],
+        }
@@ -0,0 +1,93 @@
+import numpy as np
+
+# codons in 2-bit order (A=0, C=1, G=2, T=3): index = 16 * first + 4 * second + third
+BASES = "ACGT"
+CODONS = [a + b + c for a in BASES for b in BASES for c in BASES]
+CODON_INDEX = {codon: index for index, codon in enumerate(CODONS)}
+
+# one byte -> shifted 2-bit code table per codon position; anything other than
+# A/C/G/T (N, gaps, ...) maps to 128, so a codon with an invalid base is >= 64
+_POSITION_CODES = []
+for _shift in (4, 2, 0):
+    _codes = np.full(256, 128, dtype=np.uint8)
+    for _code, _base in enumerate(BASES):
+        _codes[ord(_base)] = _code << _shift
+        _codes[ord(_base.lower())] = _code << _shift
+    _POSITION_CODES.append(_codes)
+
+
+def _translate(raw):
+    """Codon indices (>= 64 for invalid codons) of a byte array holding whole codons."""
+    raw = raw.reshape(-1, 3)
+    first, second, third = _POSITION_CODES
+    return first[raw[:, 0]] | second[raw[:, 1]] | third[raw[:, 2]]
+
+
+def _as_bytes(sequence):
+    return np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8)
+
+
+def codon_indices(sequence):
+    """Translate a sequence into codon indices in one pass.
+
+    Returns (indices, positions): the index of every complete codon made of
+    A/C/G/T only, and its codon position within the sequence. Codons with
+    any other base are masked out, as is a trailing partial codon.
+    """
+    raw = _as_bytes(sequence)
+    indices = _translate(raw[:len(raw) - len(raw) % 3])
+    positions = np.flatnonzero(indices < 64)
+    return indices[positions].astype(np.int64), positions
+
+
+def codon_counts_in_order(sequence):
+    """(codon, count) pairs of a sequence, in the order codons first appear."""
+    indices, _ = codon_indices(sequence)
+    counts = np.bincount(indices, minlength=64)
+    first = np.full(64, len(indices))
+    np.minimum.at(first, indices, np.arange(len(indices)))
+    present = np.flatnonzero(counts)
+    order = present[np.argsort(first[present])]
+    return [(CODONS[codon], count) for codon, count in zip(order.tolist(), counts[order].tolist())]
+
+
+def batch_codon_indices(sequences):
+    """Translate many sequences at once.
+
+    Returns (indices, sequence_ids, positions, codons_per_sequence): every
+    valid codon's index, the position of its sequence in the input, its
+    codon position within that sequence, and the number of complete codons
+    in each sequence (valid or not).
+    """
+    trimmed = [sequence[:len(sequence) - len(sequence) % 3] for sequence in sequences]
+    codons_per_sequence = np.fromiter((len(sequence) // 3 for sequence in trimmed), dtype=np.int64, count=len(trimmed))
+    indices = _translate(_as_bytes(''.join(trimmed)))
+
+    sequence_ids = np.repeat(np.arange(len(trimmed)), codons_per_sequence)
+    starts = np.cumsum(codons_per_sequence) - codons_per_sequence
+    valid = np.flatnonzero(indices < 64)
+    sequence_ids = sequence_ids[valid]
+    positions = valid - starts[sequence_ids]
+    return indices[valid].astype(np.int64), sequence_ids, positions, codons_per_sequence
+
+
+def gene_codon_counts(gene_names, sequences):
+    """Codon counts per gene for a batch of (gene, sequence) rows.
+
+    Returns a dict of gene -> [(codon, count), ...]. Genes appear in the
+    order of their first valid codon and codons in the order they first
+    appear for that gene, so folding the result into an insertion-ordered
+    counter gives the same order as folding the rows one by one.
+    """
+    gene_ids = {}
+    row_genes = np.fromiter((gene_ids.setdefault(gene_name, len(gene_ids)) for gene_name in gene_names),
+                            dtype=np.int64, count=len(gene_names))
+    genes = list(gene_ids)
+    indices, sequence_ids, _, _ = batch_codon_indices(sequences)
+
+    cells, first, counts = np.unique(row_genes[sequence_ids] * 64 + indices, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    grouped = {}
+    for cell, count in zip(cells[order].tolist(), counts[order].tolist()):
+        grouped.setdefault(genes[cell >> 6], []).append((CODONS[cell & 63], count))
+    return grouped
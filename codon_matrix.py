@@ -0,0 +1,278 @@
+import numpy as np
+
+from codon_index import CODONS, CODON_INDEX, batch_codon_indices
+from hash_map import CODON_TABLE, GenomeOptimality, clean_rows
+
+# amino-acid grouping derived from CODON_TABLE
+AMINO_ACIDS = sorted(set(CODON_TABLE.values()))
+CODON_AMINO_ACID_LIST = [AMINO_ACIDS.index(CODON_TABLE[codon]) for codon in CODONS]
+CODON_AMINO_ACID = np.array(CODON_AMINO_ACID_LIST)
+AMINO_ACID_CODONS = [np.flatnonzero(CODON_AMINO_ACID == group) for group in range(len(AMINO_ACIDS))]
+_AMINO_ACID_ONEHOT = np.eye(len(AMINO_ACIDS), dtype=np.int64)[CODON_AMINO_ACID]
+
+# first_seen value of a codon that has not been counted yet
+NEVER = np.iinfo(np.int64).max
+
+
+class CodonMatrix:
+    """Dense codon counting engine: one row of 64 codon counts per gene.
+
+    Gene names are interned to row ids in the order they are first seen.
+    Next to the counts, the matrix keeps the ordinal at which each codon was
+    first seen in each gene, so ties and iteration order come out exactly as
+    in the insertion-ordered CodonHashMap and Transcript engines.
+    """
+
+    def __init__(self, capacity=1024, clock=0):
+        self.gene_index = {}
+        self.gene_names = []
+        self.clock = clock
+        self._counts = np.zeros((capacity, 64), dtype=np.int64)
+        self._first_seen = np.full((capacity, 64), NEVER, dtype=np.int64)
+        self._gene_rows = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.gene_names)
+
+    @classmethod
+    def from_codon_map(cls, codon_map, gene_counts):
+        """Build a matrix from CodonHashMap counts and the gene_counts HashMap.
+
+        First-seen ordinals follow the hash maps' insertion order.
+        """
+        matrix = cls(capacity=max(len(gene_counts), 1))
+        for gene_name, count in gene_counts.items():
+            matrix._gene_rows[matrix.row(gene_name)] = count
+        for transcript_id, transcript_data in codon_map.transcripts.items():
+            row = matrix.row(transcript_id)
+            for _, amino_acid_data in transcript_data.items():
+                for codon, count in amino_acid_data.items():
+                    index = CODON_INDEX[codon]
+                    matrix._counts[row, index] = count
+                    matrix._first_seen[row, index] = matrix.clock
+                    matrix.clock += 1
+        return matrix
+
+    def copy(self):
+        """Independent matrix with the same genes, counts, first-seen ordinals and clock."""
+        matrix = CodonMatrix(capacity=len(self._gene_rows), clock=self.clock)
+        matrix.gene_names = list(self.gene_names)
+        matrix.gene_index = dict(self.gene_index)
+        matrix._counts[:] = self._counts
+        matrix._first_seen[:] = self._first_seen
+        matrix._gene_rows[:] = self._gene_rows
+        return matrix
+
+    @property
+    def counts(self):
+        """Codon counts, shape (genes, 64)."""
+        return self._counts[:len(self.gene_names)]
+
+    @property
+    def first_seen(self):
+        """Ordinal at which each codon was first seen per gene, shape (genes, 64)."""
+        return self._first_seen[:len(self.gene_names)]
+
+    @property
+    def gene_rows(self):
+        """Number of sequences added per gene (the hash map's gene_counts)."""
+        return self._gene_rows[:len(self.gene_names)]
+
+    def _grow(self, capacity):
+        counts = np.zeros((capacity, 64), dtype=np.int64)
+        first_seen = np.full((capacity, 64), NEVER, dtype=np.int64)
+        gene_rows = np.zeros(capacity, dtype=np.int64)
+        used = len(self.gene_names)
+        counts[:used] = self._counts[:used]
+        first_seen[:used] = self._first_seen[:used]
+        gene_rows[:used] = self._gene_rows[:used]
+        self._counts, self._first_seen, self._gene_rows = counts, first_seen, gene_rows
+
+    def row(self, gene_name):
+        """Return the row id of a gene, interning it if it is new."""
+        row = self.gene_index.get(gene_name)
+        if row is None:
+            row = len(self.gene_names)
+            if row == len(self._gene_rows):
+                self._grow(max(2 * row, 1024))
+            self.gene_index[gene_name] = row
+            self.gene_names.append(gene_name)
+        return row
+
+    def add_sequences(self, gene_names, sequences):
+        """Count a batch of (gene, sequence) rows with one vectorized translation."""
+        rows = np.fromiter((self.row(gene_name) for gene_name in gene_names), dtype=np.int64, count=len(gene_names))
+        np.add.at(self._gene_rows, rows, 1)
+        indices, sequence_ids, positions, codons_per_sequence = batch_codon_indices(sequences)
+
+        # every sequence advances the clock by its codon count plus one
+        offsets = self.clock + np.cumsum(codons_per_sequence + 1) - (codons_per_sequence + 1)
+        cells = rows[sequence_ids] * 64 + indices
+        np.add.at(self._counts.reshape(-1), cells, 1)
+        np.minimum.at(self._first_seen.reshape(-1), cells, offsets[sequence_ids] + positions)
+        self.clock += int(codons_per_sequence.sum()) + len(codons_per_sequence)
+
+    def add_chunks(self, chunks):
+        """Fold DataFrame chunks (see hash_map.iter_csv_chunks) into the matrix.
+
+        Rows are cleaned the same way as in hash_map.process_gene_data.
+        """
+        for chunk in chunks:
+            self.add_sequences(*clean_rows(chunk))
+        return self
+
+    def append_sequences(self, gene_names, sequences, genome):
+        """add_sequences that also keeps a running GenomeOptimality up to date.
+
+        The touched genes' old contributions are removed from genome before
+        counting and their new ones added after. Returns the touched rows in
+        first-seen order.
+        """
+        known = [self.gene_index[gene_name] for gene_name in dict.fromkeys(gene_names) if gene_name in self.gene_index]
+        for row in known:
+            genome.remove(self.codon_counts_in_order(row), int(self._gene_rows[row]))
+
+        self.add_sequences(gene_names, sequences)
+
+        rows = [self.gene_index[gene_name] for gene_name in dict.fromkeys(gene_names)]
+        for row in rows:
+            genome.add(self.codon_counts_in_order(row), int(self._gene_rows[row]))
+        return rows
+
+    def merge(self, other):
+        """Fold another matrix's counts into this one and return self.
+
+        Genes new to this matrix are appended in the other matrix's order,
+        so merging shard results left to right in file order reproduces the
+        matrix a serial pass would build. The merge is associative.
+        """
+        rows = np.fromiter((self.row(gene_name) for gene_name in other.gene_names), dtype=np.int64, count=len(other))
+        self._counts[rows] += other.counts
+        self._first_seen[rows] = np.minimum(self._first_seen[rows], other.first_seen)
+        self._gene_rows[rows] += other.gene_rows
+        self.clock = max(self.clock, other.clock)
+        return self
+
+    def codon_counts_in_order(self, row):
+        """(codon, count) pairs of a gene row, in the order codons were first seen."""
+        codons = np.flatnonzero(self._counts[row])
+        codons = codons[np.argsort(self._first_seen[row, codons], kind='stable')]
+        return [(CODONS[codon], count) for codon, count in zip(codons.tolist(), self._counts[row, codons].tolist())]
+
+    def amino_acid_totals(self):
+        """Codon totals per gene and amino acid, shape (genes, amino acids)."""
+        return self.counts @ _AMINO_ACID_ONEHOT
+
+    def calculate_usage_rates(self):
+        """Usage rate of every codon within its amino acid, shape (genes, 64)."""
+        totals = self.amino_acid_totals()[:, CODON_AMINO_ACID]
+        usage = np.zeros(totals.shape, dtype=np.float64)
+        np.divide(self.counts, totals, out=usage, where=totals > 0)
+        return usage
+
+    def _ordered_amino_acids(self, row):
+        """Codons of a gene grouped by amino acid, both in first-seen order."""
+        codons = np.flatnonzero(self._counts[row])
+        codons = codons[np.argsort(self._first_seen[row, codons], kind='stable')]
+        groups = {}
+        for codon in codons.tolist():
+            groups.setdefault(CODON_AMINO_ACID_LIST[codon], []).append(codon)
+        return groups
+
+    def _codon_gene_order(self):
+        """Rows of genes with counted codons, in the order of their first codon.
+
+        This is the order in which CodonHashMap creates its transcripts.
+        """
+        rows = np.flatnonzero((self.counts > 0).any(axis=1))
+        return rows[np.argsort(self.first_seen[rows].min(axis=1), kind='stable')]
+
+    def normalize_codon_usage(self, rows=None):
+        """Vectorized equivalent of hash_map.normalize_codon_usage.
+
+        rows limits the result to those gene rows, in the given order.
+        """
+        usage = self.calculate_usage_rates()
+        normalized = {}
+        if rows is None:
+            rows = self._codon_gene_order()
+        for row in rows:
+            if not self._counts[row].any():
+                continue
+            row_usage = usage[row].tolist()
+            normalized[self.gene_names[row]] = {
+                AMINO_ACIDS[group]: {CODONS[codon]: row_usage[codon] for codon in codons}
+                for group, codons in self._ordered_amino_acids(row).items()
+            }
+        return normalized
+
+    def genome_codon_totals(self):
+        """Genome-wide codon totals as aggregate_optimality weighs them, shape (64,).
+
+        Each gene's codon counts are scaled by its sequence count, as in
+        hash_map.aggregate_optimality.
+        """
+        return (self.counts * self.gene_rows[:, None]).sum(axis=0)
+
+    def aggregate_optimality(self):
+        """Vectorized equivalent of hash_map.aggregate_optimality.
+
+        Codon counts are scaled by each gene's sequence count and summed
+        genome-wide; ties go to the codon the hash map would meet first.
+        """
+        counts = self.counts
+        genome_wide = self.genome_codon_totals()
+        gene_order = self._codon_gene_order()
+        if not len(gene_order):
+            return {}
+        present = counts[gene_order] > 0
+        seen = present.any(axis=0)
+        first_rank = present.argmax(axis=0)
+        first_order = self.first_seen[gene_order[first_rank], np.arange(64)]
+
+        ranked = []
+        for group, codons in enumerate(AMINO_ACID_CODONS):
+            codons = codons[seen[codons]]
+            if not len(codons):
+                continue
+            order = sorted(codons, key=lambda codon: (first_rank[codon], first_order[codon]))
+            best = max(order, key=lambda codon: genome_wide[codon])
+            ranked.append(((first_rank[order[0]], first_order[order[0]]), group, best))
+        ranked.sort(key=lambda item: item[0])
+        return {AMINO_ACIDS[group]: CODONS[best] for _, group, best in ranked}
+
+    def genome_optimality(self):
+        """Running GenomeOptimality seeded in CodonHashMap iteration order."""
+        genome = GenomeOptimality()
+        for row in self._codon_gene_order():
+            genome.add(self.codon_counts_in_order(row), int(self._gene_rows[row]))
+        return genome
+
+    def optimal_codon_indices(self):
+        """Per gene and amino acid, the most used codon (-1 where the amino acid is absent).
+
+        Ties go to the codon seen first in the gene, matching MaxHeap order.
+        """
+        counts = self.counts
+        best = np.full((len(self), len(AMINO_ACIDS)), -1, dtype=np.int64)
+        for group, codons in enumerate(AMINO_ACID_CODONS):
+            group_counts = counts[:, codons]
+            top = group_counts.max(axis=1)
+            tied = np.where(group_counts == top[:, None], self.first_seen[:, codons], NEVER)
+            picked = codons[tied.argmin(axis=1)]
+            best[:, group] = np.where(top > 0, picked, -1)
+        return best
+
+    def get_optimal_codons(self):
+        """Vectorized equivalent of Transcript.get_optimal_codons for every gene."""
+        usage = self.calculate_usage_rates()
+        best = self.optimal_codon_indices()
+        optimal = {}
+        for row in np.flatnonzero(self.counts.any(axis=1)):
+            row_best = best[row].tolist()
+            row_usage = usage[row].tolist()
+            optimal[self.gene_names[row]] = {
+                AMINO_ACIDS[group]: (CODONS[row_best[group]], row_usage[row_best[group]])
+                for group in self._ordered_amino_acids(row)
+            }
+        return optimal
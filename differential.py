@@ -0,0 +1,173 @@
+import numpy as np
+
+from codon_index import CODONS
+from codon_matrix import AMINO_ACIDS, CODON_AMINO_ACID
+
+# codon -> amino acid membership, for summing per-codon terms by amino acid
+AMINO_ACID_ONEHOT = np.eye(len(AMINO_ACIDS))[CODON_AMINO_ACID]
+
+# orderings accepted by differential_usage; ties fall back to the next key, then to gene order
+SORT_KEYS = {
+    'divergence': ('divergence', 'max_abs_delta'),
+    'max_delta': ('max_abs_delta', 'divergence'),
+    'flips': ('flips', 'divergence'),
+}
+
+# most genes returned by one comparison
+MAX_DIFFERENTIAL_GENES = 1000
+
+# compare page fragment listing the most divergent genes of sample1 and sample2 via api_differential
+DIFFERENTIAL_TEMPLATE = """
+    <h2>Differential codon usage</h2>
+    <table id="differential" border="1" cellpadding="4" style="border-collapse: collapse;">
+        <thead>
+            <tr><th>Gene</th><th>JS divergence</th><th>Max |delta|</th><th>Optimal codon flips</th></tr>
+        </thead>
+        <tbody></tbody>
+    </table>
+    <p id="differential-summary"></p>
+    <script>
+        fetch({{ url_for('.api_differential', sample1=sample1, sample2=sample2, limit=20)|tojson }})
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    console.error(data.error);
+                    return;
+                }
+                const body = document.querySelector('#differential tbody');
+                data.genes.forEach(gene => {
+                    const row = body.insertRow();
+                    const flips = gene.optimal_flips.map(f => `${f.amino_acid}: ${f.codon1} → ${f.codon2}`).join(', ');
+                    [gene.gene_name, gene.divergence.toFixed(4), gene.max_abs_delta.toFixed(4), flips]
+                        .forEach(text => { row.insertCell().textContent = text; });
+                });
+                const summary = data.summary;
+                document.getElementById('differential-summary').textContent =
+                    `${summary.common_genes} genes in both samples, ${summary.flipped_genes} with an optimal codon flip, ` +
+                    `mean divergence ${summary.mean_divergence.toFixed(4)}`;
+            });
+    </script>
+"""
+
+
+class UsageProfile:
+    """Codon usage of every gene of one sample as dense (genes, 64) arrays.
+
+    usage is each codon's share of its amino acid within the gene, and
+    optimal the gene's most used codon per amino acid (-1 where the amino
+    acid is absent), ties going to the codon seen first as in MaxHeap.
+    The arrays are copies, so the profile stays valid while the matrix
+    it was built from keeps counting.
+    """
+
+    def __init__(self, matrix):
+        self.gene_names = list(matrix.gene_names)
+        self.gene_index = dict(matrix.gene_index)
+        self.counts = matrix.counts.copy()
+        self.amino_acid_totals = matrix.amino_acid_totals()
+        self.usage = matrix.calculate_usage_rates()
+        self.optimal = matrix.optimal_codon_indices()
+
+
+def _kl_terms(p, m):
+    # p * log2(p / m) per codon, 0 where p is 0 (m > 0 wherever p > 0)
+    ratio = np.divide(p, m, out=np.ones_like(p), where=p > 0)
+    return p * np.log2(ratio)
+
+
+def js_divergence(usage1, totals1, usage2, totals2):
+    """Jensen-Shannon divergence (bits, 0 to 1) between two sets of synonymous codon usage.
+
+    usage arrays hold per-codon usage rates (..., 64) and totals arrays
+    codon counts per amino acid (..., amino acids); leading axes broadcast.
+    Each amino acid's divergence is averaged, weighted by its codon counts
+    on both sides, over the amino acids present on both sides.
+    """
+    compared = (totals1 > 0) & (totals2 > 0)
+    codon_compared = compared[..., CODON_AMINO_ACID]
+    usage1 = np.where(codon_compared, usage1, 0.0)
+    usage2 = np.where(codon_compared, usage2, 0.0)
+    mean = (usage1 + usage2) / 2
+    amino_acid_divergence = (0.5 * (_kl_terms(usage1, mean) + _kl_terms(usage2, mean))) @ AMINO_ACID_ONEHOT
+    weights = np.where(compared, totals1 + totals2, 0)
+    weight_sums = weights.sum(axis=-1)
+    return np.divide((amino_acid_divergence * weights).sum(axis=-1), weight_sums,
+                     out=np.zeros(weight_sums.shape), where=weight_sums > 0)
+
+
+def differential_usage(profile1, profile2, limit=50, sort='divergence'):
+    """Rank the genes of two samples by how differently they use synonymous codons.
+
+    Genes are aligned by name, and an amino acid is compared only where
+    both samples have codons for it in that gene. For every common gene,
+    all at once:
+    - the usage delta of each codon (sample2 - sample1);
+    - the Jensen-Shannon divergence between the two codon distributions
+      (see js_divergence);
+    - the amino acids whose optimal codon differs between the samples.
+    Returns a summary and the top limit genes in sort order (see SORT_KEYS),
+    each with its flips and codon deltas.
+    """
+    common = [gene_name for gene_name in profile1.gene_names if gene_name in profile2.gene_index]
+    rows1 = np.fromiter((profile1.gene_index[gene_name] for gene_name in common), dtype=np.int64, count=len(common))
+    rows2 = np.fromiter((profile2.gene_index[gene_name] for gene_name in common), dtype=np.int64, count=len(common))
+
+    totals1 = profile1.amino_acid_totals[rows1]
+    totals2 = profile2.amino_acid_totals[rows2]
+    compared = (totals1 > 0) & (totals2 > 0)
+    codon_compared = compared[:, CODON_AMINO_ACID]
+    usage1 = np.where(codon_compared, profile1.usage[rows1], 0.0)
+    usage2 = np.where(codon_compared, profile2.usage[rows2], 0.0)
+    delta = usage2 - usage1
+    max_abs_delta = np.abs(delta).max(axis=1, initial=0.0)
+    divergence = js_divergence(usage1, totals1, usage2, totals2)
+
+    optimal1 = profile1.optimal[rows1]
+    optimal2 = profile2.optimal[rows2]
+    flipped = compared & (optimal1 != optimal2)
+    flips = flipped.sum(axis=1)
+
+    metrics = {'divergence': divergence, 'max_abs_delta': max_abs_delta, 'flips': flips}
+    primary, secondary = SORT_KEYS[sort]
+    order = np.lexsort((np.arange(len(common)), -metrics[secondary], -metrics[primary]))[:limit]
+
+    genes = []
+    for gene in order.tolist():
+        codons = np.flatnonzero(codon_compared[gene] & ((usage1[gene] > 0) | (usage2[gene] > 0)))
+        codons = codons[np.argsort(-np.abs(delta[gene, codons]), kind='stable')]
+        genes.append({
+            'gene_name': common[gene],
+            'divergence': float(divergence[gene]),
+            'max_abs_delta': float(max_abs_delta[gene]),
+            'flips': int(flips[gene]),
+            'optimal_flips': [
+                {
+                    'amino_acid': AMINO_ACIDS[group],
+                    'codon1': CODONS[optimal1[gene, group]],
+                    'codon2': CODONS[optimal2[gene, group]],
+                }
+                for group in np.flatnonzero(flipped[gene]).tolist()
+            ],
+            'codons': [
+                {
+                    'amino_acid': AMINO_ACIDS[CODON_AMINO_ACID[codon]],
+                    'codon': CODONS[codon],
+                    'usage1': float(usage1[gene, codon]),
+                    'usage2': float(usage2[gene, codon]),
+                    'delta': float(delta[gene, codon]),
+                }
+                for codon in codons.tolist()
+            ],
+        })
+
+    return {
+        'summary': {
+            'genes1': len(profile1.gene_names),
+            'genes2': len(profile2.gene_names),
+            'common_genes': len(common),
+            'flipped_genes': int((flips > 0).sum()),
+            'flips': int(flips.sum()),
+            'mean_divergence': float(divergence.mean()) if len(common) else 0.0,
+        },
+        'genes': genes,
+    }
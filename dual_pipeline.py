@@ -0,0 +1,129 @@
+import argparse
+import sys
+import time
+
+import hash_map_visuals
+import max_heap
+from codon_matrix import CodonMatrix
+from hash_map import build_output_data, clean_fields
+from instrumentation import ProcessingMetrics
+from readers import iter_batches
+
+
+def count_file(filename, metrics=None, progress=None):
+    """Count an input file once for both engines; return (hash_map matrix, max_heap matrix).
+
+    The engines only differ in how they clean a row: hash_map strips and
+    upper-cases fields (and reads missing ones as 'nan'), max_heap takes
+    them raw. Both engines share one CodonMatrix for as long as cleaning
+    leaves every row unchanged. The first batch it changes forks the
+    matrix, and each engine counts its own version of the rows from there
+    on, so typical input is translated and counted once.
+    """
+    if metrics is None:
+        metrics = ProcessingMetrics()
+    hash_map_matrix = max_heap_matrix = CodonMatrix()
+    for gene_names, sequences in metrics.timed('parse', iter_batches(filename, max_heap.BATCH_SIZE)):
+        transcript_ids, cleaned = clean_fields(gene_names, sequences)
+        with metrics.stage('count'):
+            shared = hash_map_matrix is max_heap_matrix
+            if shared and (transcript_ids != gene_names or cleaned != sequences):
+                hash_map_matrix, shared = max_heap_matrix.copy(), False
+            max_heap_matrix.add_sequences(gene_names, sequences)
+            if not shared:
+                hash_map_matrix.add_sequences(transcript_ids, cleaned)
+        metrics.rows += len(gene_names)
+        if progress is not None:
+            progress(len(gene_names))
+    return hash_map_matrix, max_heap_matrix
+
+
+def process_file(filename, cache=None, metrics=None, progress=None):
+    """Both engines' output rows from one pass over an input file.
+
+    Returns (hash_map rows, max_heap rows, elapsed_time); the rows are the
+    ones hash_map_visuals.process_file and max_heap.process_file return.
+    cache is an optional result_cache.ResultCache; both engines' entries
+    are read from it when present and written after a pass otherwise.
+    """
+    if metrics is None:
+        metrics = ProcessingMetrics()
+    start_time = time.time()
+    stores = {}
+    if cache is not None:
+        stores = {engine: cache.open(filename, engine) for engine in ('hash_map', 'max_heap')}
+    if stores and None not in stores.values():
+        with stores['hash_map'], stores['max_heap'], metrics.stage('cache_load'):
+            hash_map_rows = stores['hash_map'].hash_map_rows()
+            max_heap_rows = stores['max_heap'].max_heap_rows()
+            metrics.rows = int(stores['hash_map'].columns['gene_rows'].sum())
+            metrics.codons = int(stores['hash_map'].columns['count'].sum())
+        if progress is not None:
+            progress(metrics.rows)
+        return hash_map_rows, max_heap_rows, time.time() - start_time
+    for store in stores.values():
+        if store is not None:
+            store.close()
+
+    hash_map_matrix, max_heap_matrix = count_file(filename, metrics, progress)
+    metrics.codons = int(hash_map_matrix.counts.sum())
+    if cache is not None:
+        with metrics.stage('cache_store'):
+            cache.store(filename, 'hash_map', hash_map_matrix)
+            cache.store(filename, 'max_heap', max_heap_matrix)
+
+    with metrics.stage('normalize'):
+        normalized_usage = hash_map_matrix.normalize_codon_usage()
+    with metrics.stage('aggregate'):
+        genome_optimality = hash_map_matrix.aggregate_optimality()
+    with metrics.stage('build_output'):
+        hash_map_rows = build_output_data(normalized_usage, genome_optimality)
+        max_heap_rows = max_heap.build_matrix_output_data(max_heap_matrix)
+    return hash_map_rows, max_heap_rows, time.time() - start_time
+
+
+def _first_difference(rows, expected):
+    for position, (row, expected_row) in enumerate(zip(rows, expected)):
+        if row != expected_row:
+            return f"row {position}: {row} != {expected_row}"
+    if len(rows) != len(expected):
+        return f"{len(rows)} rows != {len(expected)} rows"
+    return None
+
+
+def check_parity(filename):
+    """Compare process_file with the separate engines on one CSV.
+
+    Returns {engine: first difference} for the engines whose rows differ
+    in content or order; an empty dict means both match exactly.
+    """
+    hash_map_rows, max_heap_rows, _ = process_file(filename)
+    expected = {
+        'hash_map': hash_map_visuals.process_file(filename, shards=1, cache=None)[0],
+        'max_heap': max_heap.process_file(filename)[0],
+    }
+    differences = {
+        'hash_map': _first_difference(hash_map_rows, expected['hash_map']),
+        'max_heap': _first_difference(max_heap_rows, expected['max_heap']),
+    }
+    return {engine: difference for engine, difference in differences.items() if difference}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the single-pass pipeline against the separate engines.")
+    parser.add_argument('csv_files', nargs='+')
+    args = parser.parse_args()
+
+    failed = False
+    for filename in args.csv_files:
+        differences = check_parity(filename)
+        if not differences:
+            print(f"{filename}: hash_map and max_heap outputs match")
+        for engine, difference in differences.items():
+            failed = True
+            print(f"{filename}: {engine} differs at {difference}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,128 @@
+from array import array
+import math
+import time
+
 import pandas as pd
 
+from codon_index import gene_codon_counts
+from instrumentation import ProcessingMetrics
+from readers import input_format, is_plain_csv, iter_batches, open_binary
+
+# marks an unused slot in the HashMap index table
+_EMPTY = -1
+
 class HashMap:
-    def __init__(self, size=1000):
+    """Open-addressing hash map that grows with its load factor.
+
+    Entries live in flat, insertion-ordered key/value/hash arrays; the
+    sparse index table only stores positions into those arrays and is the
+    only thing rebuilt on resize.
+    """
+
+    def __init__(self, size=8, load_factor=2 / 3):
+        # probing needs an empty slot to stop at, so the table may never fill up
+        if not 0 < load_factor < 1:
+            raise ValueError(f"load_factor must be between 0 and 1 (exclusive), got {load_factor}")
+        capacity = 8
+        while capacity < size:
+            capacity <<= 1
+        self.size = capacity
+        self.load_factor = load_factor
+        self._indices = array('i', [_EMPTY]) * capacity
+        self._hashes = array('q')
+        self._keys = []
+        self._values = []
+
+    def _find_slot(self, key, key_hash):
+        """Return the slot holding key, or the empty slot where it belongs."""
+        indices = self._indices
+        hashes = self._hashes
+        keys = self._keys
+        mask = self.size - 1
+        slot = key_hash & mask
+        while True:
+            entry = indices[slot]
+            if entry == _EMPTY:
+                return slot
+            if hashes[entry] == key_hash and keys[entry] == key:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _resize(self, size):
+        """Rebuild the index table with the given number of slots."""
         self.size = size
-        self.map = [None] * size
-
-    def _hash(self, key):
-        """Hash function to calculate the index."""
-        return hash(key) % self.size
+        mask = size - 1
+        indices = array('i', [_EMPTY]) * size
+        for entry, key_hash in enumerate(self._hashes):
+            slot = key_hash & mask
+            while indices[slot] != _EMPTY:
+                slot = (slot + 1) & mask
+            indices[slot] = entry
+        self._indices = indices
 
     def insert(self, key, value):
         """Insert or update a key-value pair."""
-        index = self._hash(key)
-
-        if self.map[index] is None:
-            self.map[index] = [[key, value]]
-        else:
-            for pair in self.map[index]:
-                if pair[0] == key:
-                    pair[1] = value
-                    return
-            self.map[index].append([key, value])
-
-    def get(self, key):
+        key_hash = hash(key)
+        slot = self._find_slot(key, key_hash)
+        entry = self._indices[slot]
+        if entry != _EMPTY:
+            self._values[entry] = value
+            return
+
+        self._append(slot, key, key_hash, value)
+
+    def _append(self, slot, key, key_hash, value):
+        """Store a new entry at an empty slot, growing the table if needed."""
+        self._indices[slot] = len(self._keys)
+        self._hashes.append(key_hash)
+        self._keys.append(key)
+        self._values.append(value)
+        if len(self._keys) > self.size * self.load_factor:
+            self._resize(self.size * 2)
+
+    def increment(self, key, amount=1):
+        """Add amount to the count stored under key with a single probe."""
+        key_hash = hash(key)
+        slot = self._find_slot(key, key_hash)
+        entry = self._indices[slot]
+        if entry == _EMPTY:
+            self._append(slot, key, key_hash, amount)
+            return amount
+        value = self._values[entry] + amount
+        self._values[entry] = value
+        return value
+
+    def get(self, key, default=None):
         """Retrieve a value by key."""
-        index = self._hash(key)
-        if self.map[index] is not None:
-            for pair in self.map[index]:
-                if pair[0] == key:
-                    return pair[1]
-        return None
+        key_hash = hash(key)
+        entry = self._indices[self._find_slot(key, key_hash)]
+        if entry == _EMPTY:
+            return default
+        return self._values[entry]
 
     def keys(self):
         """Get all keys."""
-        keys = []
-        for bucket in self.map:
-            if bucket is not None:
-                for pair in bucket:
-                    keys.append(pair[0])
-        return keys
+        return list(self._keys)
+
+    def values(self):
+        """Get all values."""
+        return list(self._values)
 
     def items(self):
         """Get all key-value pairs."""
-        items = []
-        for bucket in self.map:
-            if bucket is not None:
-                for pair in bucket:
-                    items.append((pair[0], pair[1]))
-        return items
+        return list(zip(self._keys, self._values))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return self._indices[self._find_slot(key, hash(key))] != _EMPTY
 
     def __repr__(self):
         """String representation of the hash map."""
         result = "{"
-        for bucket in self.map:
-            if bucket is not None:
-                for pair in bucket:
-                    result += f"{repr(pair[0])}: {repr(pair[1])}, "
+        for key, value in zip(self._keys, self._values):
+            result += f"{repr(key)}: {repr(value)}, "
         result += "}"
         return result
 
@@ -63,22 +130,48 @@ class CodonHashMap:
     def __init__(self):
         self.transcripts = HashMap()
 
-    def update_codon(self, transcript_id, amino_acid, codon):
-        # Check if transcript exists
+    def _transcript_data(self, transcript_id):
         transcript_data = self.transcripts.get(transcript_id)
-        if not transcript_data:
+        if transcript_data is None:
             transcript_data = HashMap()
             self.transcripts.insert(transcript_id, transcript_data)
+        return transcript_data
 
-        # Check if amino acid exists in the transcript
+    def _amino_acid_data(self, transcript_data, amino_acid):
         amino_acid_data = transcript_data.get(amino_acid)
-        if not amino_acid_data:
+        if amino_acid_data is None:
             amino_acid_data = HashMap()
             transcript_data.insert(amino_acid, amino_acid_data)
+        return amino_acid_data
 
-        # Update codon count
-        current_count = amino_acid_data.get(codon) or 0
-        amino_acid_data.insert(codon, current_count + 1)
+    def update_codon(self, transcript_id, amino_acid, codon):
+        transcript_data = self._transcript_data(transcript_id)
+        self._amino_acid_data(transcript_data, amino_acid).increment(codon)
+
+    def increment_many(self, transcript_id, codons):
+        """Fold a sequence's codons into one transcript."""
+        self.increment_counts(transcript_id, ((codon, 1) for codon in codons))
+
+    def increment_counts(self, transcript_id, codon_counts):
+        """Fold (codon, count) pairs into one transcript.
+
+        The transcript is looked up once and each amino acid map at most
+        once; codons missing from CODON_TABLE are skipped, and a transcript
+        is only created once it has a valid codon.
+        """
+        transcript_data = None
+        amino_acid_maps = {}
+        for codon, count in codon_counts:
+            amino_acid = CODON_TABLE.get(codon)
+            if amino_acid is None:
+                continue
+            amino_acid_data = amino_acid_maps.get(amino_acid)
+            if amino_acid_data is None:
+                if transcript_data is None:
+                    transcript_data = self._transcript_data(transcript_id)
+                amino_acid_data = self._amino_acid_data(transcript_data, amino_acid)
+                amino_acid_maps[amino_acid] = amino_acid_data
+            amino_acid_data.increment(codon, count)
 
     def get_transcript(self, transcript_id):
         return self.transcripts.get(transcript_id)
@@ -117,45 +210,115 @@ def parse_csv(file_path):
     data = pd.read_csv(file_path, delimiter=',', quotechar='"')
     return data
 
+# Streaming CSV file
+def iter_csv_chunks(file_path, chunk_size=100000):
+    """Read the gene_name/sequence columns as string DataFrames of chunk_size rows.
+
+    Peak memory is bounded by the chunk size rather than the file size.
+    Gzipped inputs are decompressed on a separate thread and FASTA/FASTQ
+    inputs give the same columns (see readers).
+    """
+    if not isinstance(file_path, str) or is_plain_csv(file_path):
+        return _read_csv_chunks(file_path, chunk_size)
+    return _iter_input_chunks(file_path, chunk_size)
+
+def _read_csv_chunks(source, chunk_size):
+    return pd.read_csv(
+        source,
+        delimiter=',',
+        quotechar='"',
+        usecols=['gene_name', 'sequence'],
+        dtype={'gene_name': str, 'sequence': str},
+        na_values=NA_VALUES,
+        keep_default_na=False,
+        chunksize=chunk_size,
+    )
+
+def _iter_input_chunks(file_path, chunk_size):
+    if input_format(file_path)[0] == 'csv':
+        with open_binary(file_path) as stream, _read_csv_chunks(stream, chunk_size) as chunks:
+            yield from chunks
+        return
+    # fields read as missing in a CSV are missing here too
+    for gene_names, sequences in iter_batches(file_path, chunk_size):
+        yield pd.DataFrame({
+            'gene_name': [math.nan if gene_name in NA_VALUES else gene_name for gene_name in gene_names],
+            'sequence': [math.nan if sequence in NA_VALUES else sequence for sequence in sequences],
+        })
+
+# fields read as missing, in CSV chunks and by clean_fields alike (pandas' default na_values)
+NA_VALUES = frozenset({
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+})
+
+def clean_rows(data):
+    """Return the stripped transcript ids and upper-cased sequences of a DataFrame."""
+    transcript_ids = [str(gene_name).strip() for gene_name in data['gene_name']]
+    sequences = [str(sequence).strip().upper() for sequence in data['sequence']]
+    return transcript_ids, sequences
+
+def clean_fields(gene_names, sequences):
+    """clean_rows for raw csv fields (None for a missing field).
+
+    Fields in NA_VALUES become 'nan', as str() makes of the missing
+    values iter_csv_chunks reads for them in clean_rows.
+    """
+    transcript_ids = ['nan' if gene_name is None or gene_name in NA_VALUES else gene_name.strip()
+                      for gene_name in gene_names]
+    sequences = ['NAN' if sequence is None or sequence in NA_VALUES else sequence.strip().upper()
+                 for sequence in sequences]
+    return transcript_ids, sequences
+
 # Processing codon data
-def process_gene_data(data, codon_map, gene_counts):
-    total_rows = len(data)
-    for idx, (_, row) in enumerate(data.iterrows(), 1):
-        transcript_id = str(row['gene_name']).strip()
-        sequence = str(row['sequence']).strip().upper()
-
-        # Update gene count
-        current_count = gene_counts.get(transcript_id) or 0
-        gene_counts.insert(transcript_id, current_count + 1)
-
-        # Split sequence into codons and update counts
-        codons = [sequence[i:i+3] for i in range(0, len(sequence)-2, 3)]
-        for codon in codons:
-            if codon in CODON_TABLE:
-                amino_acid = CODON_TABLE[codon]
-                codon_map.update_codon(transcript_id, amino_acid, codon)
+def process_gene_data(data, codon_map, gene_counts, batch_size=100000, progress=None):
+    # progress, if given, is called with the number of rows after every batch
+    for start in range(0, len(data), batch_size):
+        transcript_ids, sequences = clean_rows(data.iloc[start:start + batch_size])
+        process_gene_rows(transcript_ids, sequences, codon_map, gene_counts)
+        if progress is not None:
+            progress(len(transcript_ids))
 
     return gene_counts
 
+def process_gene_rows(transcript_ids, sequences, codon_map, gene_counts):
+    """Count a batch of cleaned (transcript id, sequence) rows into the counters."""
+    # Update gene counts
+    for transcript_id in transcript_ids:
+        gene_counts.increment(transcript_id)
+
+    # Translate the whole batch at once and update codon counts per transcript
+    for transcript_id, codon_counts in gene_codon_counts(transcript_ids, sequences).items():
+        codon_map.increment_counts(transcript_id, codon_counts)
+
+def transcript_codon_counts(transcript_data):
+    """(codon, count) pairs of one transcript, grouped by amino acid."""
+    for _, amino_acid_data in transcript_data.items():
+        yield from amino_acid_data.items()
+
 # Normalize codon usage
-def normalize_codon_usage(codon_map):
+def normalize_transcript(transcript_data):
     normalized = {}
 
-    for transcript_id, transcript_data in codon_map.transcripts.items():
-        normalized[transcript_id] = {}
+    for amino_acid, amino_acid_data in transcript_data.items():
+        total_codons = sum(
+            count for _, count in amino_acid_data.items()
+        )
 
-        for amino_acid, amino_acid_data in transcript_data.items():
-            total_codons = sum(
-                count for _, count in amino_acid_data.items()
-            )
+        if total_codons == 0:  # avoid division by zero
+            continue
 
-            if total_codons == 0:  # avoid division by zero
-                continue
+        normalized[amino_acid] = {
+            codon: count / total_codons
+            for codon, count in amino_acid_data.items()
+        }
 
-            normalized[transcript_id][amino_acid] = {
-                codon: count / total_codons
-                for codon, count in amino_acid_data.items()
-            }
+    return normalized
+
+def normalize_codon_usage(codon_map):
+    normalized = {}
+    for transcript_id, transcript_data in codon_map.transcripts.items():
+        normalized[transcript_id] = normalize_transcript(transcript_data)
 
     return normalized
 
@@ -184,4 +347,92 @@ def aggregate_optimality(codon_map, gene_counts):
             key=lambda x: x[1] if x else 0
         )[0]
 
-    return optimal_codon
\ No newline at end of file
+    return optimal_codon
+
+# Stream one file into fresh counters
+def count_file(file_path, chunk_size=100000, metrics=None, progress=None):
+    """(codon map, gene counts) of a CSV; metrics, if given, gets stage timings and row and codon counts."""
+    if metrics is None:
+        metrics = ProcessingMetrics()
+    codon_map = CodonHashMap()
+    gene_counts = HashMap()
+    for chunk in metrics.timed('parse', iter_csv_chunks(file_path, chunk_size)):
+        with metrics.stage('count'):
+            process_gene_data(chunk, codon_map, gene_counts, progress=progress)
+        metrics.rows += len(chunk)
+    metrics.codons = sum(
+        count for _, transcript_data in codon_map.transcripts.items()
+        for _, count in transcript_codon_counts(transcript_data)
+    )
+    return codon_map, gene_counts
+
+# Output rows of counted data
+def counted_output_data(codon_map, gene_counts, metrics=None):
+    if metrics is None:
+        metrics = ProcessingMetrics()
+    with metrics.stage('normalize'):
+        normalized_usage = normalize_codon_usage(codon_map)
+    with metrics.stage('aggregate'):
+        genome_optimality = aggregate_optimality(codon_map, gene_counts)
+    with metrics.stage('build_output'):
+        return build_output_data(normalized_usage, genome_optimality)
+
+# Full pipeline for one file
+def process_file(file_path, chunk_size=100000, metrics=None, progress=None):
+    """Stream a CSV through the counters; return (output rows, elapsed seconds)."""
+    start_time = time.time()
+    codon_map, gene_counts = count_file(file_path, chunk_size, metrics=metrics, progress=progress)
+    output_data = counted_output_data(codon_map, gene_counts, metrics)
+    return output_data, time.time() - start_time
+
+# build output rows from normalized usage and the genome-wide optimal codons
+def build_output_data(normalized_usage, genome_optimality):
+    output_data = []
+    for transcript_id, amino_acids in normalized_usage.items():
+        for amino_acid, codons in amino_acids.items():
+            optimal_codon = genome_optimality.get(amino_acid)
+            for codon, usage in codons.items():
+                output_data.append({
+                    'gene_name': transcript_id,
+                    'amino_acid': amino_acid,
+                    'optimal_codon': optimal_codon,
+                    'codon': codon,
+                    'usage_rate': usage
+                })
+    return output_data
+
+class GenomeOptimality:
+    """Running genome-wide codon totals behind aggregate_optimality.
+
+    Every gene adds count * scale_factor per codon. When rows are appended
+    to a gene, its old contribution is removed and the new one added, so
+    the optimal codons are refreshed without rescanning every transcript.
+    Amino acids and codons keep the order they were first accumulated in,
+    which aggregate_optimality also uses to break ties.
+    """
+
+    def __init__(self):
+        self.totals = {}
+
+    def add(self, codon_counts, scale_factor, sign=1):
+        """Add a gene's (codon, count) pairs scaled by its sequence count."""
+        if scale_factor == 0:  # skip transcripts with no scale factor
+            return
+        for codon, count in codon_counts:
+            amino_acid = CODON_TABLE.get(codon)
+            if amino_acid is None:
+                continue
+            codon_totals = self.totals.setdefault(amino_acid, {})
+            codon_totals[codon] = codon_totals.get(codon, 0) + sign * count * scale_factor
+
+    def remove(self, codon_counts, scale_factor):
+        """Undo an earlier add with the same counts and scale factor."""
+        self.add(codon_counts, scale_factor, sign=-1)
+
+    def optimal_codons(self):
+        """Same result as aggregate_optimality over the accumulated genes."""
+        return {
+            amino_acid: max(codon_totals.items(), key=lambda x: x[1])[0]
+            for amino_acid, codon_totals in self.totals.items()
+            if codon_totals
+        }
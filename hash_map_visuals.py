@@ -1,143 +1,361 @@
 import os
-import pandas as pd
 import circlify
-from flask import Flask, render_template_string, jsonify, request, redirect, url_for
+from flask import Blueprint, Flask, render_template_string, jsonify, request, redirect, url_for
 import threading
 import time
 
+from analysis import SampleAnalysis, register_analysis_routes
+from codon_matrix import CodonMatrix
+from differential import DIFFERENTIAL_TEMPLATE
+from instrumentation import METRICS_TEMPLATE, ProcessingMetrics
+from layout_cache import LayoutCache
+from processing import SampleProcessor, open_cached, register_processing_routes
+from progress import PROGRESS_TEMPLATE, estimate_rows
+from result_cache import ResultCache
+from sample_registry import registry
+from sample_index import SampleIndex
+from sample_store import SampleStore
+from sharding import count_file_sharded
+
 # processing functions from hash_map.py
 from hash_map import (
-    HashMap,
-    CodonHashMap,
-    CODON_TABLE,
-    parse_csv,
-    process_gene_data,
-    normalize_codon_usage,
-    aggregate_optimality
+    build_output_data,
+    clean_rows,
+    count_file,
+    counted_output_data,
+    iter_csv_chunks,
 )
 
-app = Flask(__name__)
-
-# global variables to store processing status, times, and data
-processing_status = {}
-processing_times = {}
-processed_data = {}
-data_lock = threading.Lock()
-
-# process one file
-def process_file(filename):
+# routes of this view; mounted at / when run on its own, under /hash_map in main_visuals
+bp = Blueprint('hash_map', __name__)
+
+# rows read per CSV chunk; bounds the memory used while parsing a file
+CHUNK_SIZE = 100000
+
+# byte-range shards each file is split into; 1 counts a file on a single core
+SHARDS_PER_FILE = 1
+
+CSV_FILES = [
+    "csvs/P42_Brain_Ribo_rep1.csv",
+    "csvs/P42_Brain_Ribo_rep2.csv",
+    "csvs/P42_Heart_Ribo_rep1.csv",
+    "csvs/P42_Heart_Ribo_rep2.csv",
+    "csvs/P42_Kidney_Ribo_rep1.csv",
+    "csvs/P42_Kidney_Ribo_rep2.csv",
+    "csvs/P42_Liver_Ribo_rep1.csv",
+    "csvs/P42_Lung_Ribo_rep1.csv",
+    "csvs/P42_Lung_Ribo_rep2.csv",
+    "csvs/P42_Retina_Ribo_rep2.csv",
+]
+
+# per-sample codon counts cached on disk, keyed by input file fingerprint
+result_cache = ResultCache()
+
+# memoized circle-packing layouts served by /api/visualize
+layout_cache = LayoutCache()
+
+# measure each sample's peak memory with tracemalloc; False only reports the process's lifetime peak RSS, which is cheaper
+TRACE_MEMORY = True
+
+# compute the gene-level layout as soon as a sample completes
+PREWARM_LAYOUTS = True
+
+# processing status and progress are shared with the other views of this process; data, times and metrics are this view's
+view = registry.view('hash_map')
+processing_status = registry.status
+processing_times = view.times
+processing_metrics = view.metrics
+processed_data = view.data
+
+# live per-sample progress, pushed to the status page without taking data_lock
+progress_broker = registry.progress
+sample_indexes = view.indexes
+data_lock = registry.lock
+
+# per-sample counts kept for appends: sample -> (CodonMatrix, GenomeOptimality, {gene: output rows})
+sample_counts = {}
+append_lock = threading.Lock()
+
+# process one file; shards > 1 splits it into byte ranges counted on separate processes
+def process_file(filename, chunk_size=CHUNK_SIZE, shards=SHARDS_PER_FILE, max_workers=None, cache=result_cache,
+                 metrics=None, progress=None):
+    # metrics is an optional instrumentation.ProcessingMetrics filled with stage timings and counts;
+    # progress, if given, is called with the number of rows counted after every batch
+    if metrics is None:
+        metrics = ProcessingMetrics()
     start_time = time.time()
-    codon_map = CodonHashMap()
-    gene_counts = HashMap()
-
-    data = parse_csv(filename)
-
-    # process and update codon map and gene counts
-    process_gene_data(data, codon_map, gene_counts)
-
-    # normalize codon usage
-    normalized_usage = normalize_codon_usage(codon_map)
-
-    # aggregate genome-wide optimality
-    genome_optimality = aggregate_optimality(codon_map, gene_counts)
-
-    # build output data
-    output_data = []
-    for transcript_id, amino_acids in normalized_usage.items():
-        for amino_acid, codons in amino_acids.items():
-            optimal_codon = genome_optimality.get(amino_acid)
-            for codon, usage in codons.items():
-                output_data.append({
-                    'gene_name': transcript_id,
-                    'amino_acid': amino_acid,
-                    'optimal_codon': optimal_codon,
-                    'codon': codon,
-                    'usage_rate': usage
-                })
+    store = cache.open(filename, 'hash_map') if cache is not None else None
+    if store is not None:
+        with store, metrics.stage('cache_load'):
+            output_data = store.hash_map_rows()
+            metrics.rows = int(store.columns['gene_rows'].sum())
+            metrics.codons = int(store.columns['count'].sum())
+        if progress is not None:
+            progress(metrics.rows)
+        return output_data, time.time() - start_time
+
+    if shards > 1:
+        with metrics.stage('count'):
+            codon_matrix = count_file_sharded(filename, shards, clean=True, max_workers=max_workers)
+        if cache is not None:
+            with metrics.stage('cache_store'):
+                cache.store(filename, 'hash_map', codon_matrix)
+        metrics.rows = int(codon_matrix.gene_rows.sum())
+        metrics.codons = int(codon_matrix.counts.sum())
+        if progress is not None:
+            progress(metrics.rows)
+        with metrics.stage('normalize'):
+            normalized_usage = codon_matrix.normalize_codon_usage()
+        with metrics.stage('aggregate'):
+            genome_optimality = codon_matrix.aggregate_optimality()
+        with metrics.stage('build_output'):
+            output_data = build_output_data(normalized_usage, genome_optimality)
+    else:
+        codon_map, gene_counts = count_file(filename, chunk_size, metrics=metrics, progress=progress)
+        if cache is not None:
+            with metrics.stage('cache_store'):
+                cache.store(filename, 'hash_map', CodonMatrix.from_codon_map(codon_map, gene_counts))
+        output_data = counted_output_data(codon_map, gene_counts, metrics)
     elapsed_time = time.time() - start_time
     return output_data, elapsed_time
 
-# process multiple files
-def process_files_thread(csv_files):
-    for filename in csv_files:
-        sample_name = os.path.splitext(os.path.basename(filename))[0]
-        with data_lock:
-            processing_status[sample_name] = 'Processing'
-        try:
-            output_data, elapsed_time = process_file(filename)
-            with data_lock:
-                processed_data[sample_name] = output_data
-                processing_times[sample_name] = elapsed_time
-                processing_status[sample_name] = 'Completed'
-            print(f"Completed processing {sample_name} in {elapsed_time:.2f} seconds")
-        except Exception as e:
-            with data_lock:
-                processing_status[sample_name] = f'Error: {e}'
-            print(f"Error processing {filename}: {e}")
-
-def load_data_from_memory():
-    data = {}
+# process one file and collect its stage metrics; module level so worker processes can run it
+def process_sample(filename, progress=None):
+    metrics = ProcessingMetrics(trace_memory=TRACE_MEMORY)
+    output_data, elapsed_time = process_file(filename, metrics=metrics, progress=progress)
+    return output_data, elapsed_time, metrics.finish().as_dict()
+
+# a sample served straight from its cached counts, as process_sample returns it, or None on a miss
+def load_cached(filename):
+    cached = open_cached(result_cache, filename, ['hash_map'])
+    if cached is None:
+        return None
+    (store,), elapsed_time, metrics = cached
+    return store, elapsed_time, metrics
+
+# fill this view's data for a sample without marking it completed; output_data is a SampleStore when loaded from the cache
+def add_sample(sample_name, output_data, elapsed_time, metrics=None):
+    index = output_data.hash_map_index() if isinstance(output_data, SampleStore) else SampleIndex(output_data)
+    with data_lock:
+        processed_data[sample_name] = output_data
+        sample_indexes[sample_name] = index
+        processing_times[sample_name] = elapsed_time
+        processing_metrics[sample_name] = metrics
+    # after publishing, so nothing built from the old data can be cached again
+    with append_lock:
+        sample_counts.pop(sample_name, None)
+    analysis.invalidate(sample_name)
+    layout_cache.invalidate(sample_name)
+
+def prewarm_layout(sample_name):
+    if PREWARM_LAYOUTS:
+        threading.Thread(target=sample_layout, args=(sample_name, "gene_name"), daemon=True).start()
+
+# genome-wide codon counts of a loaded sample, read from its cached counts without loading them per gene
+def sample_codon_totals(sample_name):
+    with append_lock:
+        state = sample_counts.get(sample_name)
+        if state is not None:
+            return state[0].counts.sum(axis=0)
+    filename = registry.filename(sample_name)
+    store = result_cache.open(filename, 'hash_map')
+    if store is None:
+        return with_sample_matrix(sample_name, lambda codon_matrix: codon_matrix.counts.sum(axis=0))
+    with store:
+        return store.codon_totals()
+
+# processes sample files with process_sample, publishes them with add_sample and prewarms their layouts
+processor = SampleProcessor(process_sample, add_sample, load_cached, on_completed=prewarm_layout)
+
+# counts of a loaded sample, from the result cache or by recounting its CSV
+def load_sample_counts(sample_name):
+    filename = registry.filename(sample_name)
+    codon_matrix = result_cache.load(filename, 'hash_map')
+    if codon_matrix is None:
+        codon_matrix = CodonMatrix().add_chunks(iter_csv_chunks(filename, CHUNK_SIZE))
+
+    with data_lock:
+        output_data = processed_data.get(sample_name, [])
+    if isinstance(output_data, SampleStore):
+        # appends rebuild rows gene by gene, so a sample served from its store gets its rows here, once
+        output_data = output_data.hash_map_rows()
+    gene_rows = {}
+    for row in output_data:
+        gene_rows.setdefault(row['gene_name'], []).append(row)
+    return codon_matrix, codon_matrix.genome_optimality(), gene_rows
+
+# CodonMatrix kept for appends to a loaded sample, loaded on first use; call with append_lock held
+def kept_matrix(sample_name):
+    state = sample_counts.get(sample_name)
+    if state is None:
+        state = sample_counts[sample_name] = load_sample_counts(sample_name)
+    return state[0]
+
+# build(CodonMatrix) of a loaded sample, from the counts kept for appends, with appends held off
+def with_sample_matrix(sample_name, build):
+    with append_lock:
+        return build(kept_matrix(sample_name))
+
+# usage profiles, CAI scores and similarity matrix served by the analysis routes
+analysis = SampleAnalysis(view, with_sample_matrix, sample_codon_totals)
+
+# fold a CSV of new rows into a loaded sample, refreshing only the genes it touches
+def append_file(sample_name, filename):
+    start_time = time.time()
+    with append_lock:
+        state = sample_counts.get(sample_name)
+        if state is None:
+            state = sample_counts[sample_name] = load_sample_counts(sample_name)
+        codon_matrix, genome, gene_rows = state
+        old_optimality = genome.optimal_codons()
+
+        affected = {}
+        for chunk in iter_csv_chunks(filename, CHUNK_SIZE):
+            for row in codon_matrix.append_sequences(*clean_rows(chunk), genome):
+                affected[row] = None
+            progress_broker.advance(sample_name, len(chunk))
+        genome_optimality = genome.optimal_codons()
+
+        # rows of touched genes are rebuilt; others only when their genome-wide optimal codon moved
+        changed = {
+            amino_acid for amino_acid in set(genome_optimality) | set(old_optimality)
+            if genome_optimality.get(amino_acid) != old_optimality.get(amino_acid)
+        }
+        genes = [codon_matrix.gene_names[row] for row in affected]
+        amino_acids = {row['amino_acid'] for gene_name in genes for row in gene_rows.get(gene_name, [])}
+        # genes new to the sample are placed by their first codon, like a full pass would
+        normalized_usage = codon_matrix.normalize_codon_usage(
+            sorted(affected, key=lambda row: codon_matrix.first_seen[row].min())
+        )
+        for gene_name, usage in normalized_usage.items():
+            gene_rows[gene_name] = build_output_data({gene_name: usage}, genome_optimality)
+            amino_acids.update(usage)
+        if changed:
+            for gene_name, rows in gene_rows.items():
+                if gene_name not in normalized_usage and any(row['amino_acid'] in changed for row in rows):
+                    gene_rows[gene_name] = [
+                        dict(row, optimal_codon=genome_optimality.get(row['amino_acid'])) for row in rows
+                    ]
+
+        # the cached counts follow the sample, so a restart and the store-backed reads see the appended rows
+        result_cache.store(registry.filename(sample_name), 'hash_map', codon_matrix)
+
+        # counting is incremental; the drill-down index is rebuilt over all rows in one vectorized pass
+        output_data = [row for rows in gene_rows.values() for row in rows]
+        index = SampleIndex(output_data)
+
+    # the gene level changes with any append; deeper layouts only under touched genes and amino acids
+    def keep(key):
+        level, parent_name = key[1], key[2]
+        if level == "amino_acid":
+            return parent_name is not None and parent_name not in genes
+        if level == "codon":
+            return parent_name is not None and parent_name not in amino_acids
+        return False
+
+    elapsed_time = time.time() - start_time
+    with data_lock:
+        processed_data[sample_name] = output_data
+        sample_indexes[sample_name] = index
+        processing_times[sample_name] = processing_times.get(sample_name, 0) + elapsed_time
+        processing_status[sample_name] = 'Completed'
+    # after publishing, so nothing built from the pre-append counts can be cached again
+    analysis.invalidate(sample_name)
+    layout_cache.invalidate(sample_name, keep=keep)
+    progress_broker.finish(sample_name)
+    print(f"Appended {filename} to {sample_name}: {len(genes)} genes updated in {elapsed_time:.2f} seconds")
+    prewarm_layout(sample_name)
+
+def append_file_thread(sample_name, filename):
     with data_lock:
-        for sample_name, output_data in processed_data.items():
-            df = pd.DataFrame(output_data)
-            df['sample_name'] = sample_name
-            data[sample_name] = df
-    return data
+        processing_status[sample_name] = 'Appending'
+    progress_broker.start(sample_name, estimate_rows(filename), status='Appending')
+    try:
+        # a unified server appends to every view's counts, not only this one's
+        (registry.append or append_file)(sample_name, filename)
+    except Exception as e:
+        with data_lock:
+            processing_status[sample_name] = f'Error: {e}'
+        progress_broker.finish(sample_name, f'Error: {e}')
+        print(f"Error appending {filename} to {sample_name}: {e}")
 
-@app.route("/", methods=["GET", "POST"])
+@bp.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
-        csv_files = [
-            "csvs/P42_Brain_Ribo_rep1.csv",
-            "csvs/P42_Brain_Ribo_rep2.csv",
-            "csvs/P42_Heart_Ribo_rep1.csv",
-            "csvs/P42_Heart_Ribo_rep2.csv",
-            "csvs/P42_Kidney_Ribo_rep1.csv",
-            "csvs/P42_Kidney_Ribo_rep2.csv",
-            "csvs/P42_Liver_Ribo_rep1.csv",
-            "csvs/P42_Lung_Ribo_rep1.csv",
-            "csvs/P42_Lung_Ribo_rep2.csv",
-            "csvs/P42_Retina_Ribo_rep2.csv",
-        ]
-        threading.Thread(target=process_files_thread, args=(csv_files,), daemon=True).start()
-        return redirect(url_for('processing_status_page'))
+        csv_files = CSV_FILES
+        processor.start(csv_files)
+        return redirect(url_for('.processing_status_page'))
 
+    with data_lock:
+        status = dict(processing_status)
     return render_template_string("""
         <h1>Start Data Processing</h1>
         <form method="post">
             <input type="submit" value="Process Data">
         </form>
-    """)
+        {% if status %}
+            <!-- samples loaded from the result cache -->
+            <a href="{{ url_for('.processing_status_page') }}">View Loaded Samples</a>
+        {% endif %}
+    """, status=status)
 
-@app.route("/processing_status")
+@bp.route("/processing_status")
 def processing_status_page():
     with data_lock:
         status = dict(processing_status)
         times = dict(processing_times)
+        metrics = dict(processing_metrics)
     all_completed = all('Completed' in s for s in status.values()) and status != {}
     return render_template_string("""
         <h1>Hash Map Data Processing Status</h1>
         <ul>
             {% for sample_name, sample_status in status.items() %}
-                <li>{{ sample_name }}: {{ sample_status }}
+                <li>{{ sample_name }}: {{ sample_status }}<span id="progress-{{ sample_name }}"></span>
                     {% if 'Completed' in sample_status %}
                         - Time taken: {{ times[sample_name]|round(2) }} seconds
+                        {% if metrics.get(sample_name) %}
+                            """ + METRICS_TEMPLATE + """
+                        {% endif %}
                     {% endif %}
                 </li>
             {% endfor %}
         </ul>
         {% if not all_completed %}
-            <script>
-                setTimeout(function(){
-                    window.location.reload(1);
-                }, 5000);
-            </script>
+            """ + PROGRESS_TEMPLATE + """
         {% else %}
-            <a href="{{ url_for('select_samples') }}">Proceed to Sample Selection</a>
+            <a href="{{ url_for('.select_samples') }}">Proceed to Sample Selection</a>
+            <a href="{{ url_for('.append_page') }}">Append New Rows</a>
         {% endif %}
-    """, status=status, times=times, all_completed=all_completed)
+    """, status=status, times=times, metrics=metrics, all_completed=all_completed)
+
+@bp.route("/append", methods=["GET", "POST"])
+def append_page():
+    with data_lock:
+        samples = list(processed_data.keys())
+    if request.method == "POST":
+        sample_name = request.form.get('sample')
+        filename = request.form.get('filename', '').strip()
+        if sample_name not in samples:
+            return "Please select a loaded sample.", 400
+        if not os.path.isfile(filename):
+            return f"File '{filename}' not found.", 400
+        threading.Thread(target=append_file_thread, args=(sample_name, filename), daemon=True).start()
+        return redirect(url_for('.processing_status_page'))
+    return render_template_string("""
+        <h1>Append New Rows to a Sample</h1>
+        <form method="post">
+            <select name="sample">
+                {% for sample in samples %}
+                    <option value="{{ sample }}">{{ sample }}</option>
+                {% endfor %}
+            </select>
+            <input type="text" name="filename" placeholder="csvs/new_batch.csv">
+            <input type="submit" value="Append">
+            <button onclick="window.location.href='{{ url_for('.index') }}'" type="button">Home</button>
+        </form>
+    """, samples=samples)
 
-@app.route("/select_samples", methods=["GET", "POST"])
+@bp.route("/select_samples", methods=["GET", "POST"])
 def select_samples():
     with data_lock:
         samples = list(processed_data.keys())
@@ -146,7 +364,7 @@ def select_samples():
         if len(selected_samples) != 2:
             return "Please select exactly two samples.", 400
         # go to comparison page with selected samples
-        return redirect(url_for('compare', sample1=selected_samples[0], sample2=selected_samples[1]))
+        return redirect(url_for('.compare', sample1=selected_samples[0], sample2=selected_samples[1]))
     return render_template_string("""
         <h1>Select Two Samples to Compare</h1>
         <form method="post">
@@ -155,51 +373,20 @@ def select_samples():
             {% endfor %}
             <br>
             <input type="submit" value="Compare">
-            <button onclick="window.location.href='/'" type="button">Home</button>
+            <button onclick="window.location.href='{{ url_for('.index') }}'" type="button">Home</button>
+            <button onclick="window.location.href='{{ url_for('.similarity') }}'" type="button">Sample Similarity</button>
         </form>
     """, samples=samples)
 
-# circle packing
-def generate_circle_packing(data, level, parent_name=None):
-    next_level_map = {
-        "gene_name": "amino_acid",
-        "amino_acid": "codon"
-    }
-    group_col_map = {
-        "gene_name": "gene_name",
-        "amino_acid": "amino_acid",
-        "codon": "codon"
-    }
-    group_col = group_col_map.get(level)
-    prev_level_map = {v: k for k, v in next_level_map.items()}
-
-    if level == "gene_name":
-        filtered_data = data
-    elif parent_name is not None:
-        previous_level = prev_level_map.get(level)
-        prev_group_col = group_col_map.get(previous_level)
-        filtered_data = data[data[prev_group_col] == parent_name]
-    else:
-        filtered_data = data
-
-    if filtered_data.empty:
-        return None, None
-
-    # use counts or usage_rate based on level for circle sizes
-    if level == "codon":
-        grouped = filtered_data.groupby(group_col).agg({"usage_rate": "sum"}).reset_index()
-        size_col = 'usage_rate'
-    else:
-        grouped = filtered_data.groupby(group_col).size().reset_index(name='count')
-        size_col = 'count'
-
+# circle packing: lay out one circle per group name, sized by the matching entry of sizes
+def pack_circles(names, sizes, level):
     # prepare for circlify
     circle_data = [
-        {"id": row[group_col], "datum": row[size_col]}
-        for _, row in grouped.iterrows()
+        {"id": name, "datum": size}
+        for name, size in zip(names, sizes)
     ]
     if not circle_data:
-        return None, None
+        return None
 
     circles = circlify.circlify(
         circle_data,
@@ -222,9 +409,24 @@ def generate_circle_packing(data, level, parent_name=None):
             "level": level
         })
 
-    return plot_data, grouped[group_col].tolist()
+    return plot_data
+
+# circle packing for one level of a sample, served from the layout cache
+def sample_layout(sample_name, level, parent_name=None):
+    if level == "gene_name":
+        parent_name = None
+
+    def compute():
+        with data_lock:
+            index = sample_indexes.get(sample_name)
+        groups = index.group(level, parent_name) if index is not None else None
+        if groups is None:
+            return None
+        return pack_circles(*groups, level)
+
+    return layout_cache.get_or_compute((sample_name, level, parent_name), compute)
 
-@app.route("/compare")
+@bp.route("/compare")
 def compare():
     sample1 = request.args.get('sample1')
     sample2 = request.args.get('sample2')
@@ -233,9 +435,9 @@ def compare():
         return "Two samples are required for comparison.", 400
 
     return render_template_string("""
-        <button onclick="window.location.href='/'">Home</button>
+        <button onclick="window.location.href='{{ url_for('.index') }}'">Home</button>
         <!-- Added Back to Sample Selection button -->
-        <button onclick="window.location.href='{{ url_for('select_samples') }}'">Back to Sample Selection</button>
+        <button onclick="window.location.href='{{ url_for('.select_samples') }}'">Back to Sample Selection</button>
         <div id="samples-container" style="display: flex; flex-wrap: wrap;">
             <div style="margin: 20px;">
                 <h2>{{ sample1 }}</h2>
@@ -246,6 +448,7 @@ def compare():
                 <div id="circle-container-{{ sample2 }}"></div>
             </div>
         </div>
+""" + DIFFERENTIAL_TEMPLATE + """
         <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
         <script>
             const samples = [ "{{ sample1 }}", "{{ sample2 }}" ];
@@ -381,7 +584,7 @@ def compare():
             }
 
             function loadVisualization(sampleName, level, parentName, containerId) {
-                let url = `/api/visualize?level=${level}&sample=${encodeURIComponent(sampleName)}`;
+                let url = `{{ url_for('.api_visualize') }}?level=${level}&sample=${encodeURIComponent(sampleName)}`;
                 if (parentName) {
                     url += `&parent=${encodeURIComponent(parentName)}`;
                 }
@@ -397,7 +600,7 @@ def compare():
         </script>
     """, sample1=sample1, sample2=sample2)
 
-@app.route("/api/visualize")
+@bp.route("/api/visualize")
 def api_visualize():
     level = request.args.get("level", "gene_name")
     parent_name = request.args.get("parent", None)
@@ -409,13 +612,18 @@ def api_visualize():
     with data_lock:
         if sample_name not in processed_data:
             return jsonify({"error": f"Sample '{sample_name}' not found"}), 404
-        data_list = processed_data[sample_name]
-        data = pd.DataFrame(data_list)
 
-    plot_data, _ = generate_circle_packing(data, level, parent_name)
+    plot_data = sample_layout(sample_name, level, parent_name)
     if plot_data is None:
         return jsonify({"error": "No data available for the selected level and parent."}), 404
     return jsonify({"plot_data": plot_data, "level": level})
 
+register_analysis_routes(bp, analysis, processed_data, data_lock)
+register_processing_routes(bp, 'hash_map')
+
+app = Flask(__name__)
+app.register_blueprint(bp)
+
 if __name__ == "__main__":
+    threading.Thread(target=processor.load_cached_samples, args=(CSV_FILES,), daemon=True).start()
     app.run(port=5001, debug=True)
\ No newline at end of file
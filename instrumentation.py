@@ -0,0 +1,151 @@
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# status page fragment describing metrics[sample_name], a ProcessingMetrics.as_dict() result
+METRICS_TEMPLATE = """
+    {% set sample_metrics = metrics[sample_name] %}
+    <br><small>
+        {% for stage, seconds in sample_metrics.stages.items() %}{{ stage }} {{ "%.2f"|format(seconds) }}s{% if not loop.last %}, {% endif %}{% endfor %}
+        | {{ "%.0f"|format(sample_metrics.rows_per_second) }} rows/s, {{ "%.0f"|format(sample_metrics.codons_per_second) }} codons/s
+        {% if sample_metrics.peak_traced_bytes %}
+            | peak traced memory {{ "%.1f"|format(sample_metrics.peak_traced_bytes / 1048576) }} MB
+        {% elif sample_metrics.process_peak_rss_bytes %}
+            | process peak RSS so far {{ "%.1f"|format(sample_metrics.process_peak_rss_bytes / 1048576) }} MB
+        {% endif %}
+    </small>
+"""
+
+
+def peak_rss_bytes():
+    """High-water resident set size of this process over its whole life, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class ProcessingMetrics:
+    """Stage timings, throughput and peak memory of one sample's processing.
+
+    Stages are timed with perf_counter and nest: time spent in an inner
+    stage is not counted again in the stage around it. With trace_memory
+    the peak is tracemalloc's, reset when the sample starts, so it covers
+    this sample's allocations only. Otherwise only the process's peak RSS
+    is known; it is a high-water mark over the life of the process, not
+    this sample's usage, and is reported as such.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.stages = {}
+        self.rows = 0
+        self.codons = 0
+        self.total_seconds = 0.0
+        self.peak_traced_bytes = None
+        self.process_peak_rss_bytes = None
+        self._trace_memory = trace_memory
+        self._stack = []
+        self._start = time.perf_counter()
+        self._tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+        elif trace_memory:
+            tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._stack.pop()
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - nested
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def timed(self, name, iterable):
+        """Yield from iterable, charging the time spent producing items to a stage."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def finish(self):
+        """Record the total time and peak memory; call once processing is done."""
+        self.total_seconds = time.perf_counter() - self._start
+        if self._trace_memory:
+            self.peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+            if self._tracing:
+                tracemalloc.stop()
+        else:
+            self.process_peak_rss_bytes = peak_rss_bytes()
+        return self
+
+    def as_dict(self):
+        seconds = self.total_seconds or None
+        return {
+            'stages': dict(self.stages),
+            'rows': self.rows,
+            'codons': self.codons,
+            'total_seconds': self.total_seconds,
+            'rows_per_second': self.rows / seconds if seconds else 0.0,
+            'codons_per_second': self.codons / seconds if seconds else 0.0,
+            'peak_traced_bytes': self.peak_traced_bytes,
+            'process_peak_rss_bytes': self.process_peak_rss_bytes,
+        }
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+
+def render_prometheus(metrics_by_sample, pipeline):
+    """Prometheus text exposition of per-sample ProcessingMetrics.as_dict() results."""
+    gauges = [
+        ('codon_processing_seconds', 'Total processing time of a sample.', 'total_seconds'),
+        ('codon_processing_rows', 'Rows processed for a sample.', 'rows'),
+        ('codon_processing_codons', 'Valid codons counted for a sample.', 'codons'),
+        ('codon_processing_rows_per_second', 'Row throughput of a sample.', 'rows_per_second'),
+        ('codon_processing_codons_per_second', 'Codon throughput of a sample.', 'codons_per_second'),
+        ('codon_processing_peak_traced_bytes', 'Peak tracemalloc-traced memory while processing a sample.',
+         'peak_traced_bytes'),
+        ('codon_processing_process_peak_rss_bytes',
+         'Peak RSS of the process that processed a sample, over the whole life of that process.',
+         'process_peak_rss_bytes'),
+    ]
+    lines = [
+        '# HELP codon_processing_stage_seconds Time spent in each processing stage.',
+        '# TYPE codon_processing_stage_seconds gauge',
+    ]
+    for sample_name, metrics in metrics_by_sample.items():
+        for stage, seconds in metrics['stages'].items():
+            labels = _labels(pipeline=pipeline, sample=sample_name, stage=stage)
+            lines.append(f'codon_processing_stage_seconds{{{labels}}} {seconds:.6f}')
+
+    for name, help_text, field in gauges:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for sample_name, metrics in metrics_by_sample.items():
+            value = metrics.get(field)
+            if value is None:
+                continue
+            labels = _labels(pipeline=pipeline, sample=sample_name)
+            lines.append(f'{name}{{{labels}}} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,102 @@
+import sys
+import threading
+from collections import OrderedDict
+
+# default memory budget for cached layouts
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def estimate_size(plot_data):
+    """Rough memory footprint in bytes of a list of circle dicts."""
+    size = sys.getsizeof(plot_data)
+    for circle in plot_data:
+        size += sys.getsizeof(circle) + sum(sys.getsizeof(value) for value in circle.values())
+    return size
+
+
+class LayoutCache:
+    """Thread-safe LRU cache of circle-packing layouts.
+
+    Keys are (sample, level, parent) tuples. Least recently used layouts
+    are evicted once the estimated size of all entries exceeds max_bytes.
+    Every invalidate of a sample advances its generation, and layouts
+    computed for an earlier generation are not cached.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, plot_data, generation=None):
+        # generation, if given, is the sample's generation when plot_data was computed
+        size = estimate_size(plot_data)
+        with self._lock:
+            if generation is not None and generation != self._generations.get(key[0], 0):
+                return
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (plot_data, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted
+
+    def get_or_compute(self, key, compute):
+        """Return the cached layout for key, computing and caching it on a miss.
+
+        compute runs outside the lock, and concurrent misses on the same key
+        wait for the first caller instead of packing again. A None result, or
+        one computed while the sample was invalidated, is not cached, so
+        waiters then compute for themselves.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = threading.Event()
+                    generation = self._generations.get(key[0], 0)
+                    break
+            pending.wait()
+
+        try:
+            plot_data = compute()
+            if plot_data is not None:
+                self.put(key, plot_data, generation)
+            return plot_data
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.set()
+
+    def invalidate(self, sample_name, keep=None):
+        """Drop the layouts of a sample, except those for which keep(key) is true.
+
+        Layouts of the sample still being computed are dropped when they
+        finish, kept keys included.
+        """
+        with self._lock:
+            self._generations[sample_name] = self._generations.get(sample_name, 0) + 1
+            for key in [key for key in self._entries if key[0] == sample_name]:
+                if keep is None or not keep(key):
+                    self.total_bytes -= self._entries.pop(key)[1]
@@ -1,37 +1,77 @@
+import threading
+
 from flask import Flask, render_template_string
 
+import dual_pipeline
+import hash_map_visuals
+import max_heap_visuals
+from instrumentation import ProcessingMetrics
+from parallel import columns_to_rows, rows_to_columns
+from processing import SampleProcessor, open_cached
+from sample_registry import registry
+from sample_store import SampleStore
+
+# one server for both views: every CSV is read once and feeds the hash map and max heap views alike
 app = Flask(__name__)
+app.register_blueprint(hash_map_visuals.bp, url_prefix='/hash_map')
+app.register_blueprint(max_heap_visuals.bp, url_prefix='/max_heap')
+
+CSV_FILES = hash_map_visuals.CSV_FILES
+
+# both views read and write the same cache directory
+result_cache = hash_map_visuals.result_cache
+
+# measure each sample's peak memory with tracemalloc; False only reports the process's lifetime peak RSS, which is cheaper
+TRACE_MEMORY = True
+
+# process one file for both views in a single pass; module level so worker processes can run it
+def process_sample(filename, progress=None):
+    # returns (hash map rows, elapsed time, metrics, max heap rows as columns)
+    metrics = ProcessingMetrics(trace_memory=TRACE_MEMORY)
+    hash_map_rows, max_heap_rows, elapsed_time = dual_pipeline.process_file(
+        filename, cache=result_cache, metrics=metrics, progress=progress
+    )
+    return hash_map_rows, elapsed_time, metrics.finish().as_dict(), rows_to_columns(max_heap_rows)
+
+# a sample cached for both views, as process_sample returns it but with both SampleStores, or None on a miss
+def load_cached(filename):
+    cached = open_cached(result_cache, filename, ['hash_map', 'max_heap'])
+    if cached is None:
+        return None
+    (hash_map_store, max_heap_store), elapsed_time, metrics = cached
+    return hash_map_store, elapsed_time, metrics, max_heap_store
+
+# fill both views with a processed sample; the processor then marks it completed for both at once
+def add_sample(sample_name, hash_map_data, elapsed_time, metrics, max_heap_data):
+    if not isinstance(max_heap_data, SampleStore):
+        max_heap_data = columns_to_rows(max_heap_data)
+    hash_map_visuals.add_sample(sample_name, hash_map_data, elapsed_time, metrics)
+    max_heap_visuals.add_sample(sample_name, max_heap_data, elapsed_time, metrics)
+
+# processes sample files for both views
+processor = SampleProcessor(process_sample, add_sample, load_cached, on_completed=hash_map_visuals.prewarm_layout)
+
+# the views start processing through this processor instead of their own pipelines
+registry.ingest = processor.process_files
+
+# fold a file of new rows into a sample in both views; the hash map view then marks it completed
+def append_file(sample_name, filename):
+    max_heap_visuals.append_file(sample_name, filename)
+    hash_map_visuals.append_file(sample_name, filename)
+
+# the append page updates both views' counts, so neither is left stale
+registry.append = append_file
 
-# NOTE: to properly run this script, the hash_map_visuals.py script and the max_heap_visuals.py script must also be running on your machine
 @app.route("/")
 def index():
     return render_template_string("""
         <h1>Choose which data structure to look at:</h1>
         <div>
-            <button onclick="window.location.href='/hash_map'">Hash Map Visualizations</button>
-            <button onclick="window.location.href='/max_heap'">Max Heap Visualizations</button>
+            <button onclick="window.location.href='{{ url_for('hash_map.index') }}'">Hash Map Visualizations</button>
+            <button onclick="window.location.href='{{ url_for('max_heap.index') }}'">Max Heap Visualizations</button>
         </div>
     """)
 
-@app.route("/hash_map")
-def hash_map_redirect():
-    return render_template_string("""
-        <h1>Hash Map Visualizations</h1>
-        <p>Go to Hash Map Visualizations</p>
-        <script>
-            window.location.href = 'http://127.0.0.1:5001';
-        </script>
-    """)
-
-@app.route("/max_heap")
-def max_heap_redirect():
-    return render_template_string("""
-        <h1>Max Heap</h1>
-        <p>Go to Max Heap Visualizations</p>
-        <script>
-            window.location.href = 'http://127.0.0.1:5002';
-        </script>
-    """)
-
 if __name__ == "__main__":
-    app.run(port=5000, debug=True)
\ No newline at end of file
+    threading.Thread(target=processor.load_cached_samples, args=(CSV_FILES,), daemon=True).start()
+    app.run(port=5000, debug=True)
@@ -1,8 +1,12 @@
-import csv
-import os
 import time
 from collections import defaultdict
 
+from codon_index import CODON_INDEX, codon_counts_in_order, gene_codon_counts
+from codon_matrix import CodonMatrix
+from instrumentation import ProcessingMetrics
+from readers import iter_batches
+from sharding import count_file_sharded
+
 # codon to amino acid mapping
 codon_table = {
     'TTT': 'F', 'TTC': 'F', 'TTA': 'L', 'TTG': 'L',
@@ -29,44 +33,118 @@ def codon_to_amino_acid(codon):
 
 # MaxHeap implementation
 class MaxHeap:
-    def __init__(self):
-        self.heap = []
+    """Binary max-heap over parallel value/key arrays.
+
+    Equal values come out in insertion order, so the top of the heap is
+    the first key inserted with the highest value.
+    """
+
+    def __init__(self, items=None):
+        self.values = []
+        self.keys = []
+        self._order = []
+        self._inserted = 0
+        if items is not None:
+            self.heapify(items)
+
+    def __len__(self):
+        return len(self.values)
+
+    def heapify(self, items):
+        """Add (key, value) pairs and restore the heap in O(n)."""
+        for key, value in items:
+            self.keys.append(key)
+            self.values.append(value)
+            self._order.append(self._inserted)
+            self._inserted += 1
+        for index in range(len(self.values) // 2 - 1, -1, -1):
+            self._sift_down(index)
 
     def insert(self, key, value):
-        self.heap.append((value, key))
-        self._heapify_up(len(self.heap) - 1)
+        self.keys.append(key)
+        self.values.append(value)
+        self._order.append(self._inserted)
+        self._inserted += 1
+        self._sift_up(len(self.values) - 1)
+
+    def peek(self):
+        """Return the (value, key) at the top without removing it."""
+        if not self.values:
+            return None
+        return self.values[0], self.keys[0]
 
     def extract_max(self):
-        if not self.heap:
+        if not self.values:
+            return None
+        max_item = (self.values[0], self.keys[0])
+        value, key, order = self.values.pop(), self.keys.pop(), self._order.pop()
+        if self.values:
+            self.values[0], self.keys[0], self._order[0] = value, key, order
+            self._sift_down(0)
+        return max_item
+
+    def replace(self, key, value):
+        """Pop the top (value, key) and insert key in a single sift."""
+        if not self.values:
+            self.insert(key, value)
             return None
-        max_item = self.heap[0]
-        last_item = self.heap.pop()
-        if self.heap:
-            self.heap[0] = last_item
-            self._heapify_down(0)
+        max_item = (self.values[0], self.keys[0])
+        self.values[0], self.keys[0], self._order[0] = value, key, self._inserted
+        self._inserted += 1
+        self._sift_down(0)
         return max_item
 
-    def _heapify_up(self, index):
-        parent = (index - 1) // 2
-        if parent >= 0 and self.heap[parent][0] < self.heap[index][0]:
-            self.heap[parent], self.heap[index] = self.heap[index], self.heap[parent]
-            self._heapify_up(parent)
-
-    def _heapify_down(self, index):
-        largest = index
-        size = len(self.heap)
-        left = 2 * index + 1
-        right = 2 * index + 2
-        if left < size and self.heap[left][0] > self.heap[largest][0]:
-            largest = left
-        if right < size and self.heap[right][0] > self.heap[largest][0]:
-            largest = right
-        if largest != index:
-            self.heap[largest], self.heap[index] = self.heap[index], self.heap[largest]
-            self._heapify_down(largest)
+    def top_k(self, k):
+        """The k largest (value, key) pairs in order, leaving the heap unchanged.
+
+        Walks the heap from the root with a frontier of candidate indices,
+        so it costs O(k log k) rather than a copy of the whole heap.
+        """
+        values, keys, orders = self.values, self.keys, self._order
+        size = len(values)
+        result = []
+        frontier = MaxHeap()
+        if size and k > 0:
+            frontier.insert(0, (values[0], -orders[0]))
+        while frontier.values and len(result) < k:
+            _, index = frontier.extract_max()
+            result.append((values[index], keys[index]))
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size:
+                    frontier.insert(child, (values[child], -orders[child]))
+        return result
+
+    def _sift_up(self, index):
+        values, keys, orders = self.values, self.keys, self._order
+        value, key, order = values[index], keys[index], orders[index]
+        while index > 0:
+            parent = (index - 1) // 2
+            if values[parent] > value or (values[parent] == value and orders[parent] < order):
+                break
+            values[index], keys[index], orders[index] = values[parent], keys[parent], orders[parent]
+            index = parent
+        values[index], keys[index], orders[index] = value, key, order
+
+    def _sift_down(self, index):
+        values, keys, orders = self.values, self.keys, self._order
+        size = len(values)
+        value, key, order = values[index], keys[index], orders[index]
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+            right = child + 1
+            if right < size and (values[right] > values[child]
+                                 or (values[right] == values[child] and orders[right] < orders[child])):
+                child = right
+            if values[child] < value or (values[child] == value and orders[child] > order):
+                break
+            values[index], keys[index], orders[index] = values[child], keys[child], orders[child]
+            index = child
+        values[index], keys[index], orders[index] = value, key, order
 
     def is_empty(self):
-        return len(self.heap) == 0
+        return len(self.values) == 0
 
 class Transcript:
     def __init__(self, gene_name):
@@ -76,54 +154,104 @@ class Transcript:
         self.heaps = {}
 
     def add_sequence(self, sequence):
-        codons = [sequence[i:i+3] for i in range(0, len(sequence) - 2, 3)]
-        for codon in codons:
+        self.add_codon_counts(codon_counts_in_order(sequence))
+
+    def add_codon_counts(self, codon_counts):
+        # codon_counts holds (codon, count) pairs in the order codons first appear
+        self.heaps = {}  # heaps built by calculate_usage_rates are stale once counts change
+        for codon, count in codon_counts:
             amino_acid = codon_to_amino_acid(codon)
             if amino_acid is None:
                 continue
             if amino_acid not in self.amino_acid_codons:
                 self.amino_acid_codons[amino_acid] = {}
                 self.total_amino_acid_counts[amino_acid] = 0
-            self.amino_acid_codons[amino_acid][codon] = self.amino_acid_codons[amino_acid].get(codon, 0) + 1
-            self.total_amino_acid_counts[amino_acid] += 1
+            self.amino_acid_codons[amino_acid][codon] = self.amino_acid_codons[amino_acid].get(codon, 0) + count
+            self.total_amino_acid_counts[amino_acid] += count
 
     def calculate_usage_rates(self):
-        for amino_acid in self.amino_acid_codons:
+        # one heap per amino acid, built in O(n); only needed for more than the top codon
+        for amino_acid, codons in self.amino_acid_codons.items():
             total_count = self.total_amino_acid_counts[amino_acid]
-            heap = MaxHeap()
-            for codon in self.amino_acid_codons[amino_acid]:
-                count = self.amino_acid_codons[amino_acid][codon]
-                usage_rate = count / total_count
-                heap.insert(codon, usage_rate)
-            self.heaps[amino_acid] = heap
+            self.heaps[amino_acid] = MaxHeap(
+                (codon, count / total_count) for codon, count in codons.items()
+            )
 
     def get_optimal_codons(self):
         optimal_codons = {}
-        for amino_acid in self.heaps:
-            heap = self.heaps[amino_acid]
-            if not heap.is_empty():
-                usage_rate, codon = heap.extract_max()
-                optimal_codons[amino_acid] = (codon, usage_rate)
+        if self.heaps:
+            for amino_acid, heap in self.heaps.items():
+                if not heap.is_empty():
+                    usage_rate, codon = heap.peek()
+                    optimal_codons[amino_acid] = (codon, usage_rate)
+            return optimal_codons
+
+        # without heaps, scan each amino acid once; ties go to the first codon, as in MaxHeap
+        for amino_acid, codons in self.amino_acid_codons.items():
+            total_count = self.total_amino_acid_counts[amino_acid]
+            best_codon, best_count = None, 0
+            for codon, count in codons.items():
+                if best_codon is None or count > best_count:
+                    best_codon, best_count = codon, count
+            if best_codon is not None:
+                optimal_codons[amino_acid] = (best_codon, best_count / total_count)
         return optimal_codons
 
-def process_file(filename):
-    start_time = time.time()
+# translate and count this many rows at a time
+BATCH_SIZE = 10000
+
+def add_sequences(transcripts, gene_names, sequences):
+    # translate a batch of rows at once and fold the codon counts into their transcripts
+    for gene_name, codon_counts in gene_codon_counts(gene_names, sequences).items():
+        transcripts[gene_name].add_codon_counts(codon_counts)
+
+def read_transcripts(filename, metrics=None, progress=None):
+    # metrics (an instrumentation.ProcessingMetrics) gets CSV reading as 'parse' and translation as 'count';
+    # progress, if given, is called with the number of rows after every batch
+    if metrics is None:
+        metrics = ProcessingMetrics()
     transcripts = {}
     transcript_counts = defaultdict(int)
+    for gene_names, sequences in metrics.timed('parse', iter_batches(filename, BATCH_SIZE)):
+        metrics.rows += len(gene_names)
+        with metrics.stage('count'):
+            add_transcript_rows(transcripts, transcript_counts, gene_names, sequences)
+        if progress is not None:
+            progress(len(gene_names))
+    return transcripts, transcript_counts
 
-    with open(filename, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            gene_name = row['gene_name']
-            sequence = row['sequence']
-            transcript_counts[gene_name] += 1
-            if gene_name not in transcripts:
-                transcripts[gene_name] = Transcript(gene_name)
-            transcripts[gene_name].add_sequence(sequence)
+def add_transcript_rows(transcripts, transcript_counts, gene_names, sequences):
+    # count a batch of raw rows, creating transcripts in the order their genes first appear
+    for gene_name in gene_names:
+        transcript_counts[gene_name] += 1
+        if gene_name not in transcripts:
+            transcripts[gene_name] = Transcript(gene_name)
+    add_sequences(transcripts, gene_names, sequences)
 
-    for transcript in transcripts.values():
-        transcript.calculate_usage_rates()
+def transcripts_from_matrix(matrix):
+    # rebuild Transcripts from merged CodonMatrix counts, codons in first-seen order
+    transcripts = {}
+    for row, gene_name in enumerate(matrix.gene_names):
+        transcript = Transcript(gene_name)
+        transcript.add_codon_counts(matrix.codon_counts_in_order(row))
+        transcripts[gene_name] = transcript
+    return transcripts
 
+def matrix_from_transcripts(transcripts, transcript_counts):
+    # pack Transcript counts into a CodonMatrix, keeping their insertion order
+    matrix = CodonMatrix(capacity=max(len(transcripts), 1))
+    for gene_name, transcript in transcripts.items():
+        row = matrix.row(gene_name)
+        matrix.gene_rows[row] = transcript_counts[gene_name]
+        for codons in transcript.amino_acid_codons.values():
+            for codon, count in codons.items():
+                index = CODON_INDEX[codon]
+                matrix.counts[row, index] = count
+                matrix.first_seen[row, index] = matrix.clock
+                matrix.clock += 1
+    return matrix
+
+def build_output_data(transcripts):
     output_data = []
     for gene_name, transcript in transcripts.items():
         optimal_codons = transcript.get_optimal_codons()
@@ -134,6 +262,59 @@ def process_file(filename):
                 'optimal_codon': codon,
                 'usage_rate': f"{usage_rate:.4f}"
             })
+    return output_data
+
+def build_matrix_output_data(matrix):
+    # build_output_data straight from CodonMatrix counts of raw rows, without building Transcripts
+    output_data = []
+    for gene_name, optimal_codons in matrix.get_optimal_codons().items():
+        for amino_acid, (codon, usage_rate) in optimal_codons.items():
+            output_data.append({
+                'gene_name': gene_name,
+                'amino_acid': amino_acid,
+                'optimal_codon': codon,
+                'usage_rate': f"{usage_rate:.4f}"
+            })
+    return output_data
+
+def process_file(filename, shards=1, max_workers=None, cache=None, metrics=None, progress=None):
+    # shards > 1 splits the file into byte ranges counted on separate processes;
+    # cache is an optional result_cache.ResultCache holding per-sample counts;
+    # metrics is an optional instrumentation.ProcessingMetrics filled with stage timings and counts;
+    # progress, if given, is called with the number of rows read after every batch
+    if metrics is None:
+        metrics = ProcessingMetrics()
+    start_time = time.time()
+    store = cache.open(filename, 'max_heap') if cache is not None else None
+    if store is not None:
+        with store, metrics.stage('cache_load'):
+            output_data = store.max_heap_rows()
+            metrics.rows = int(store.columns['gene_rows'].sum())
+            metrics.codons = int(store.columns['count'].sum())
+        if progress is not None:
+            progress(metrics.rows)
+        return output_data, time.time() - start_time
+
+    matrix = None
+    if shards > 1:
+        with metrics.stage('count'):
+            matrix = count_file_sharded(filename, shards, clean=False, max_workers=max_workers)
+            transcripts = transcripts_from_matrix(matrix)
+        metrics.rows = int(matrix.gene_rows.sum())
+        if progress is not None:
+            progress(metrics.rows)
+    else:
+        transcripts, transcript_counts = read_transcripts(filename, metrics, progress)
+    metrics.codons = sum(sum(transcript.total_amino_acid_counts.values()) for transcript in transcripts.values())
+    if cache is not None:
+        with metrics.stage('cache_store'):
+            if matrix is None:
+                matrix = matrix_from_transcripts(transcripts, transcript_counts)
+            cache.store(filename, 'max_heap', matrix)
+
+    # only the top codon per amino acid is needed, so no heaps are built
+    with metrics.stage('build_output'):
+        output_data = build_output_data(transcripts)
 
     elapsed_time = time.time() - start_time
     return output_data, elapsed_time
@@ -153,10 +334,10 @@ def main():
     ]
 
     output_folder = "output_csvs"
-    os.makedirs(output_folder, exist_ok=True)
 
-    for filename in csv_files:
-        process_file(filename, output_folder)
+    # batch imports this module, so it is only loaded once main runs
+    from batch import run_batch
+    run_batch(csv_files, 'max_heap', output_folder)
 
     print(f"Optimal codons for all files have been saved to the '{output_folder}' folder.")
 
@@ -1,100 +1,193 @@
-import os
-import pandas as pd
 import circlify
-from flask import Flask, render_template_string, jsonify, request, redirect, url_for
+from flask import Blueprint, Flask, render_template_string, jsonify, request, redirect, url_for
 import threading
-import json
-import gzip
-import base64
 import time
 from collections import defaultdict
 
 import max_heap
-
-app = Flask(__name__)
-
-# global variables to store processing status, times, and data
-processing_status = {}
-processing_times = {}
-processed_data = {}
-data_lock = threading.Lock()
-
-# process multiple files in a separate thread
-def process_files_thread(csv_files):
-    for filename in csv_files:
-        sample_name = os.path.splitext(os.path.basename(filename))[0]
-        with data_lock:
-            processing_status[sample_name] = 'Processing'
-        # Process one file
-        output_data, elapsed_time = max_heap.process_file(filename)
-        with data_lock:
-            processed_data[sample_name] = output_data
-            processing_times[sample_name] = elapsed_time
-            processing_status[sample_name] = 'Completed'
-
-def load_data_from_memory():
-    data = {}
+from analysis import SampleAnalysis, register_analysis_routes
+from differential import DIFFERENTIAL_TEMPLATE
+from instrumentation import METRICS_TEMPLATE, ProcessingMetrics
+from processing import SampleProcessor, open_cached, register_processing_routes
+from progress import PROGRESS_TEMPLATE
+from result_cache import ResultCache
+from sample_registry import registry
+from sample_index import SampleIndex
+from sample_store import SampleStore
+from readers import iter_batches
+from sharding import count_input
+from top_k_query import top_usage
+
+# routes of this view; mounted at / when run on its own, under /max_heap in main_visuals
+bp = Blueprint('max_heap', __name__)
+
+CSV_FILES = [
+    "csvs/P42_Brain_Ribo_rep1.csv",
+    "csvs/P42_Brain_Ribo_rep2.csv",
+    "csvs/P42_Heart_Ribo_rep1.csv",
+    "csvs/P42_Heart_Ribo_rep2.csv",
+    "csvs/P42_Kidney_Ribo_rep1.csv",
+    "csvs/P42_Kidney_Ribo_rep2.csv",
+    "csvs/P42_Liver_Ribo_rep1.csv",
+    "csvs/P42_Lung_Ribo_rep1.csv",
+    "csvs/P42_Lung_Ribo_rep2.csv",
+    "csvs/P42_Retina_Ribo_rep2.csv",
+]
+
+# per-sample codon counts cached on disk, keyed by input file fingerprint
+result_cache = ResultCache()
+
+# processing status and progress are shared with the other views of this process; data, times and metrics are this view's
+view = registry.view('max_heap')
+processing_status = registry.status
+processing_times = view.times
+processing_metrics = view.metrics
+processed_data = view.data
+sample_indexes = view.indexes
+data_lock = registry.lock
+
+# drill-down levels of the compare page; the last level is sized by summed usage_rate
+LEVELS = ("gene_name", "amino_acid", "optimal_codon")
+
+# measure each sample's peak memory with tracemalloc; False only reports the process's lifetime peak RSS, which is cheaper
+TRACE_MEMORY = True
+
+# largest k accepted by /api/top_k
+MAX_TOP_K = 10000
+
+# process one file, reusing cached counts when the input has not changed, and collect its stage metrics
+def process_file(filename, progress=None):
+    metrics = ProcessingMetrics(trace_memory=TRACE_MEMORY)
+    output_data, elapsed_time = max_heap.process_file(filename, cache=result_cache, metrics=metrics, progress=progress)
+    return output_data, elapsed_time, metrics.finish().as_dict()
+
+# a sample served straight from its cached counts, as process_file returns it, or None on a miss
+def load_cached(filename):
+    cached = open_cached(result_cache, filename, ['max_heap'])
+    if cached is None:
+        return None
+    (store,), elapsed_time, metrics = cached
+    return store, elapsed_time, metrics
+
+# fill this view's data for a sample without marking it completed; output_data is a SampleStore when loaded from the cache
+def add_sample(sample_name, output_data, elapsed_time, metrics=None):
+    index = output_data.max_heap_index() if isinstance(output_data, SampleStore) else SampleIndex(output_data, levels=LEVELS)
     with data_lock:
-        for sample_name, output_data in processed_data.items():
-            df = pd.DataFrame(output_data)
-            df['sample_name'] = sample_name
-            data[sample_name] = df
-    return data
+        processed_data[sample_name] = output_data
+        sample_indexes[sample_name] = index
+        processing_times[sample_name] = elapsed_time
+        processing_metrics[sample_name] = metrics
+    # after publishing, so nothing built from the old data can be cached again
+    analysis.invalidate(sample_name)
+
+# counts of a loaded sample, from the result cache or by recounting its file
+def load_sample_matrix(sample_name):
+    filename = registry.filename(sample_name)
+    codon_matrix = result_cache.load(filename, 'max_heap')
+    if codon_matrix is None:
+        codon_matrix = count_input(filename, clean=False)
+    return codon_matrix
+
+# cached counts of a loaded sample as a SampleStore, recounting its file and caching the counts on a miss
+def open_sample_store(sample_name):
+    filename = registry.filename(sample_name)
+    store = result_cache.open(filename, 'max_heap')
+    if store is None:
+        result_cache.store(filename, 'max_heap', count_input(filename, clean=False))
+        store = result_cache.open(filename, 'max_heap')
+    return store
+
+# build(CodonMatrix) of a loaded sample
+def with_sample_matrix(sample_name, build):
+    return build(load_sample_matrix(sample_name))
+
+# genome-wide codon counts of a loaded sample, read from its cached counts without loading them per gene
+def sample_codon_totals(sample_name):
+    filename = registry.filename(sample_name)
+    store = result_cache.open(filename, 'max_heap')
+    if store is None:
+        return load_sample_matrix(sample_name).counts.sum(axis=0)
+    with store:
+        return store.codon_totals()
+
+# usage profiles, CAI scores and similarity matrix served by the analysis routes
+analysis = SampleAnalysis(view, with_sample_matrix, sample_codon_totals)
+
+# processes sample files with process_file and publishes them with add_sample
+processor = SampleProcessor(process_file, add_sample, load_cached)
+
+# held while a sample's counts are read, extended and written back by append_file
+append_lock = threading.Lock()
+
+# fold a file of new rows into a loaded sample's counts, cache them and rebuild the sample's rows
+def append_file(sample_name, filename):
+    start_time = time.time()
+    with append_lock:
+        codon_matrix = load_sample_matrix(sample_name)
+        # the matrix clock carries on, so codons first seen in the new rows rank after the old ones, as in one pass
+        for gene_names, sequences in iter_batches(filename, max_heap.BATCH_SIZE):
+            codon_matrix.add_sequences(gene_names, sequences)
+        result_cache.store(registry.filename(sample_name), 'max_heap', codon_matrix)
+        output_data = max_heap.build_matrix_output_data(codon_matrix)
+        index = SampleIndex(output_data, levels=LEVELS)
+
+    elapsed_time = time.time() - start_time
+    with data_lock:
+        processed_data[sample_name] = output_data
+        sample_indexes[sample_name] = index
+        processing_times[sample_name] = processing_times.get(sample_name, 0) + elapsed_time
+    # after publishing, so nothing built from the pre-append counts can be cached again
+    analysis.invalidate(sample_name)
 
-@app.route("/", methods=["GET", "POST"])
+@bp.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
-        csv_files = [
-            "csvs/P42_Brain_Ribo_rep1.csv",
-            "csvs/P42_Brain_Ribo_rep2.csv",
-            "csvs/P42_Heart_Ribo_rep1.csv",
-            "csvs/P42_Heart_Ribo_rep2.csv",
-            "csvs/P42_Kidney_Ribo_rep1.csv",
-            "csvs/P42_Kidney_Ribo_rep2.csv",
-            "csvs/P42_Liver_Ribo_rep1.csv",
-            "csvs/P42_Lung_Ribo_rep1.csv",
-            "csvs/P42_Lung_Ribo_rep2.csv",
-            "csvs/P42_Retina_Ribo_rep2.csv",
-        ]
-        threading.Thread(target=process_files_thread, args=(csv_files,), daemon=True).start()
-        return redirect(url_for('processing_status_page'))
+        csv_files = CSV_FILES
+        processor.start(csv_files)
+        return redirect(url_for('.processing_status_page'))
 
+    with data_lock:
+        status = dict(processing_status)
     return render_template_string("""
         <h1>Start Data Processing</h1>
         <form method="post">
             <input type="submit" value="Process Data">
         </form>
-    """)
+        {% if status %}
+            <!-- samples loaded from the result cache -->
+            <a href="{{ url_for('.processing_status_page') }}">View Loaded Samples</a>
+        {% endif %}
+    """, status=status)
 
-@app.route("/processing_status")
+@bp.route("/processing_status")
 def processing_status_page():
     with data_lock:
         status = dict(processing_status)
         times = dict(processing_times)
+        metrics = dict(processing_metrics)
     all_completed = all(s == 'Completed' for s in status.values()) and status != {}
     return render_template_string("""
         <h1>Data Processing Status</h1>
         <ul>
             {% for sample_name, sample_status in status.items() %}
-                <li>{{ sample_name }}: {{ sample_status }}
+                <li>{{ sample_name }}: {{ sample_status }}<span id="progress-{{ sample_name }}"></span>
                     {% if sample_status == 'Completed' %}
                         - Time taken: {{ times[sample_name]|round(2) }} seconds
+                        {% if metrics.get(sample_name) %}
+                            """ + METRICS_TEMPLATE + """
+                        {% endif %}
                     {% endif %}
                 </li>
             {% endfor %}
         </ul>
         {% if not all_completed %}
-            <script>
-                setTimeout(function(){
-                    window.location.reload(1);
-                }, 5000);
-            </script>
+            """ + PROGRESS_TEMPLATE + """
         {% else %}
-            <a href="{{ url_for('select_samples') }}">Proceed to Sample Selection</a>
+            <a href="{{ url_for('.select_samples') }}">Proceed to Sample Selection</a>
         {% endif %}
-    """, status=status, times=times, all_completed=all_completed)
+    """, status=status, times=times, metrics=metrics, all_completed=all_completed)
 
-@app.route("/select_samples", methods=["GET", "POST"])
+@bp.route("/select_samples", methods=["GET", "POST"])
 def select_samples():
     with data_lock:
         samples = list(processed_data.keys())
@@ -102,7 +195,7 @@ def select_samples():
         selected_samples = request.form.getlist('samples')
         if len(selected_samples) != 2:
             return "Please select exactly two samples.", 400
-        return redirect(url_for('compare', sample1=selected_samples[0], sample2=selected_samples[1]))
+        return redirect(url_for('.compare', sample1=selected_samples[0], sample2=selected_samples[1]))
     return render_template_string("""
         <h1>Select Two Samples to Compare</h1>
         <form method="post">
@@ -111,11 +204,12 @@ def select_samples():
             {% endfor %}
             <br>
             <input type="submit" value="Compare">
-            <button onclick="window.location.href='/'" type="button">Home</button>
+            <button onclick="window.location.href='{{ url_for('.index') }}'" type="button">Home</button>
+            <button onclick="window.location.href='{{ url_for('.similarity') }}'" type="button">Sample Similarity</button>
         </form>
     """, samples=samples)
 
-@app.route("/compare")
+@bp.route("/compare")
 def compare():
     sample1 = request.args.get('sample1')
     sample2 = request.args.get('sample2')
@@ -124,22 +218,12 @@ def compare():
         return "Two samples are required for comparison.", 400
 
     with data_lock:
-        data_sample1 = processed_data.get(sample1)
-        data_sample2 = processed_data.get(sample2)
-
-    if not data_sample1 or not data_sample2:
-        return "Sample data not found.", 404
-
-    # compress data and encode to base64 for safe embedding
-    data_bytes_sample1 = json.dumps(data_sample1).encode('utf-8')
-    compressed_data_sample1 = base64.b64encode(gzip.compress(data_bytes_sample1)).decode('utf-8')
-
-    data_bytes_sample2 = json.dumps(data_sample2).encode('utf-8')
-    compressed_data_sample2 = base64.b64encode(gzip.compress(data_bytes_sample2)).decode('utf-8')
+        if sample1 not in processed_data or sample2 not in processed_data:
+            return "Sample data not found.", 404
 
     return render_template_string("""
         <!-- Back to Sample Selection button -->
-        <button onclick="window.location.href='{{ url_for('select_samples') }}'">Back to Sample Selection</button>
+        <button onclick="window.location.href='{{ url_for('.select_samples') }}'">Back to Sample Selection</button>
         <div id="samples-container" style="display: flex; flex-wrap: wrap;">
             <div style="margin: 20px;">
                 <h2>{{ sample1 }}</h2>
@@ -150,36 +234,13 @@ def compare():
                 <div id="circle-container-{{ sample2 }}"></div>
             </div>
         </div>
+""" + DIFFERENTIAL_TEMPLATE + """
 
         <!-- Include necessary libraries -->
-        <script src="https://cdnjs.cloudflare.com/ajax/libs/pako/2.0.4/pako.min.js"></script>
         <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
         <script src="https://d3js.org/d3.v6.min.js"></script>
 
-        <!-- Decompress and store data -->
         <script>
-            const compressedDataSample1 = {{ compressed_data_sample1 | tojson }};
-            const compressedDataSample2 = {{ compressed_data_sample2 | tojson }};
-
-            function decompressData(compressedData) {
-                const compressedBytes = Uint8Array.from(atob(compressedData), c => c.charCodeAt(0));
-                const decompressedBytes = pako.inflate(compressedBytes);
-                const decoder = new TextDecoder('utf-8');
-                const jsonString = decoder.decode(decompressedBytes);
-                return JSON.parse(jsonString);
-            }
-
-            const dataSample1 = decompressData(compressedDataSample1);
-            const dataSample2 = decompressData(compressedDataSample2);
-            const samplesData = {
-                "{{ sample1 }}": dataSample1,
-                "{{ sample2 }}": dataSample2
-            };
-
-            // Debugging: Log the data to ensure it's correctly decompressed
-            console.log('Data for {{ sample1 }}:', dataSample1);
-            console.log('Data for {{ sample2 }}:', dataSample2);
-
             const samples = [ "{{ sample1 }}", "{{ sample2 }}" ];
             const history = {};  // To keep track of navigation history for each sample
 
@@ -190,72 +251,35 @@ def compare():
             });
 
             function loadVisualization(sampleName, level, parentName, containerId) {
-                // Filter data on the client side
-                const data = samplesData[sampleName];
-                const filteredData = filterData(data, level, parentName);
-                const plotData = generateCirclePacking(filteredData, level);
-
-                if (!plotData) {
-                    console.error("No data available for the selected level and parent.");
-                    return;
-                }
-
-                plotVisualization(plotData, level, parentName, sampleName, containerId);
-            }
-
-            function filterData(data, level, parentName) {
-                const nextLevelMap = {
-                    "gene_name": "amino_acid",
-                    "amino_acid": "optimal_codon"
-                };
-                const groupColMap = {
-                    "gene_name": "gene_name",
-                    "amino_acid": "amino_acid",
-                    "optimal_codon": "optimal_codon"
-                };
-                const groupCol = groupColMap[level];
-                const prevLevelMap = {};
-                for (let key in nextLevelMap) {
-                    prevLevelMap[nextLevelMap[key]] = key;
-                }
-
-                let filteredData = data;
-
-                if (level !== "gene_name" && parentName != null) {
-                    const previousLevel = prevLevelMap[level];
-                    const prevGroupCol = groupColMap[previousLevel];
-                    filteredData = data.filter(item => item[prevGroupCol] === parentName);
+                // Fetch only the groups of the requested level from the server
+                let url = `{{ url_for('.api_visualize') }}?level=${level}&sample=${encodeURIComponent(sampleName)}`;
+                if (parentName) {
+                    url += `&parent=${encodeURIComponent(parentName)}`;
                 }
 
-                return filteredData;
+                fetch(url).then(response => response.json()).then(data => {
+                    if (data.error) {
+                        console.error(data.error);
+                        return;
+                    }
+                    const plotData = generateCirclePacking(data.groups, data.level);
+                    if (!plotData) {
+                        console.error("No data available for the selected level and parent.");
+                        return;
+                    }
+                    plotVisualization(plotData, data.level, parentName, sampleName, containerId);
+                });
             }
 
-            function generateCirclePacking(data, level) {
-                if (!data || data.length === 0) return null;
-
-                const groupColMap = {
-                    "gene_name": "gene_name",
-                    "amino_acid": "amino_acid",
-                    "optimal_codon": "optimal_codon"
-                };
-                const groupCol = groupColMap[level];
-
-                // Group data
-                const groupedData = d3.rollups(
-                    data,
-                    v => ({
-                        count: v.length,
-                        usage_rate: d3.sum(v, d => d.usage_rate || 0)
-                    }),
-                    d => d[groupCol]
-                );
+            function generateCirclePacking(groups, level) {
+                if (!groups || groups.length === 0) return null;
 
                 // Convert to hierarchical data
                 const rootData = {
                     name: "root",
-                    children: groupedData.map(([key, value]) => ({
-                        name: key,
-                        value: level === 'optimal_codon' ? value.usage_rate : value.count
+                    children: groups.map(group => ({
+                        name: group.name,
+                        value: group.value
                     }))
                 };
 
@@ -391,9 +415,74 @@ def compare():
                 }
             }
         </script>
-    """, sample1=sample1, sample2=sample2,
-         compressed_data_sample1=compressed_data_sample1,
-         compressed_data_sample2=compressed_data_sample2)
+    """, sample1=sample1, sample2=sample2)
+
+@bp.route("/api/visualize")
+def api_visualize():
+    level = request.args.get("level", "gene_name")
+    parent_name = request.args.get("parent", None)
+    sample_name = request.args.get("sample", None)
+
+    if not sample_name:
+        return jsonify({"error": "Sample name is required"}), 400
+
+    with data_lock:
+        index = sample_indexes.get(sample_name)
+    if index is None:
+        return jsonify({"error": f"Sample '{sample_name}' not found"}), 404
+
+    # rows are counted per group, except at the last level where usage rates are summed
+    groups = index.group(level, parent_name)
+    if groups is None:
+        return jsonify({"error": "No data available for the selected level and parent."}), 404
+    names, values = groups
+    return jsonify({
+        "groups": [{"name": name, "value": value} for name, value in zip(names, values)],
+        "level": level
+    })
+
+@bp.route("/api/top_k")
+def api_top_k():
+    # e.g. /api/top_k?k=100&amino_acid=A&codon=GCC&samples=P42_Brain_Ribo_rep1,P42_Heart_Ribo_rep1
+    try:
+        k = int(request.args.get("k", 100))
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+    if not 0 < k <= MAX_TOP_K:
+        return jsonify({"error": f"k must be between 1 and {MAX_TOP_K}"}), 400
+    amino_acid = (request.args.get("amino_acid") or "").upper() or None
+    codon = (request.args.get("codon") or "").upper() or None
+
+    with data_lock:
+        samples = list(processed_data)
+    if request.args.get("samples"):
+        names = request.args["samples"].split(",")
+        missing = [name for name in names if name not in samples]
+        if missing:
+            return jsonify({"error": f"Samples not found: {', '.join(missing)}"}), 404
+        samples = names
+
+    # every codon's usage is streamed from the sample stores, so results never depend on what is in memory
+    stores = {}
+    try:
+        for sample_name in samples:
+            try:
+                stores[sample_name] = open_sample_store(sample_name)
+            except OSError as e:
+                return jsonify({"error": f"Input of sample '{sample_name}' cannot be read: {e}"}), 404
+        results = top_usage(stores, k, amino_acid, codon)
+    finally:
+        for store in stores.values():
+            store.close()
+
+    return jsonify({"k": k, "amino_acid": amino_acid, "codon": codon, "results": results})
+
+register_analysis_routes(bp, analysis, processed_data, data_lock)
+register_processing_routes(bp, 'max_heap')
+
+app = Flask(__name__)
+app.register_blueprint(bp)
 
 if __name__ == "__main__":
+    threading.Thread(target=processor.load_cached_samples, args=(CSV_FILES,), daemon=True).start()
     app.run(port=5002, debug=True)
\ No newline at end of file
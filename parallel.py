@@ -0,0 +1,94 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# sample name of an input file (its name without directory, .gz and format suffix)
+from readers import sample_name as sample_name_for
+
+
+def rows_to_columns(rows):
+    """Turn a list of row dicts into a dict of column lists (cheaper to pickle)."""
+    if not rows:
+        return {}
+    return {key: [row[key] for row in rows] for key in rows[0]}
+
+
+def columns_to_rows(columns):
+    """Inverse of rows_to_columns."""
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+
+class _QueueProgress:
+    """Picklable progress callback that forwards row counts to the parent process."""
+
+    def __init__(self, queue, sample_name):
+        self.queue = queue
+        self.sample_name = sample_name
+
+    def __call__(self, rows):
+        self.queue.put((self.sample_name, rows))
+
+
+def _process_compact(process_file, filename, progress=None):
+    if progress is None:
+        output_data, *rest = process_file(filename)
+    else:
+        # an empty report as soon as a worker picks the file up, so its clock starts then
+        progress(0)
+        output_data, *rest = process_file(filename, progress=progress)
+    return (rows_to_columns(output_data), *rest)
+
+
+def _drain_progress(queue, on_progress):
+    for sample_name, rows in iter(queue.get, None):
+        on_progress(sample_name, rows)
+
+
+def process_files_in_pool(csv_files, process_file, on_complete, on_error, max_workers=None, on_progress=None):
+    """Run process_file over csv_files in a process pool.
+
+    process_file must be a module-level function returning
+    (output_data, elapsed_time, *extra). Results are shipped back as
+    columns and handed to on_complete(sample_name, output_data,
+    elapsed_time, *extra) as soon as each file finishes; failures go to
+    on_error(sample_name, filename, error).
+
+    With on_progress, process_file is also passed a progress=callback
+    keyword; the row counts workers report through it reach
+    on_progress(sample_name, rows) in this process via a managed queue.
+    A report of 0 rows arrives first, when a worker starts on the file.
+    """
+    if on_progress is None:
+        _run_pool(csv_files, process_file, on_complete, on_error, max_workers, None)
+        return
+
+    with multiprocessing.Manager() as manager:
+        queue = manager.Queue()
+        drain = threading.Thread(target=_drain_progress, args=(queue, on_progress), daemon=True)
+        drain.start()
+        try:
+            _run_pool(csv_files, process_file, on_complete, on_error, max_workers, queue)
+        finally:
+            queue.put(None)
+            drain.join()
+
+
+def _run_pool(csv_files, process_file, on_complete, on_error, max_workers, queue):
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _process_compact, process_file, filename,
+                None if queue is None else _QueueProgress(queue, sample_name_for(filename)),
+            ): filename
+            for filename in csv_files
+        }
+        for future in as_completed(futures):
+            filename = futures[future]
+            sample_name = sample_name_for(filename)
+            try:
+                columns, *rest = future.result()
+            except Exception as e:
+                on_error(sample_name, filename, e)
+                continue
+            on_complete(sample_name, columns_to_rows(columns), *rest)
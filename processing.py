@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+
+from flask import Response, stream_with_context
+
+from instrumentation import ProcessingMetrics, render_prometheus
+from parallel import process_files_in_pool, sample_name_for
+from progress import estimate_rows
+from sample_registry import registry
+
+# worker processes used to process sample files; 1 processes them one by one
+PROCESSING_WORKERS = os.cpu_count() or 1
+
+
+class SampleProcessor:
+    """Runs one pipeline over sample files and publishes the results through the registry.
+
+    process_sample(filename, progress=None) is a module-level function, so
+    worker processes can run it, returning (output_data, elapsed_time,
+    metrics, *extra); add_sample(sample_name, output_data, elapsed_time,
+    metrics, *extra) fills the views without marking the sample completed.
+    load_cached(filename) returns the same tuple for a file whose counts
+    are in the result cache, or None on a miss; it runs in this process,
+    so its output data can be the memory-mapped SampleStore itself.
+    on_completed(sample_name) runs after a sample completes.
+    """
+
+    def __init__(self, process_sample, add_sample, load_cached, on_completed=None, max_workers=PROCESSING_WORKERS):
+        self.process_sample = process_sample
+        self.add_sample = add_sample
+        self.load_cached = load_cached
+        self.on_completed = on_completed
+        self.max_workers = max_workers
+
+    def start(self, csv_files):
+        """Process the files in the background, through registry.ingest when a unified server set one."""
+        target = registry.ingest or self.process_files
+        threading.Thread(target=target, args=(csv_files,), daemon=True).start()
+
+    def process_files(self, csv_files, max_workers=None):
+        """Process the files, in a pool of worker processes when more than one worker is configured."""
+        if max_workers is None:
+            max_workers = self.max_workers
+        registry.add_files(csv_files)
+        self.queue_samples(csv_files)
+        csv_files = [filename for filename in csv_files if not self.load_cached_sample(filename)]
+        if max_workers > 1:
+            total_rows = {sample_name_for(filename): estimate_rows(filename) for filename in csv_files}
+
+            def on_progress(sample_name, rows):
+                # a file's clock starts with its worker's first report, so time queued in the pool is not counted
+                if registry.progress.start_queued(sample_name, total_rows[sample_name]):
+                    with registry.lock:
+                        if registry.status.get(sample_name) == 'Queued':
+                            registry.status[sample_name] = 'Processing'
+                registry.progress.advance(sample_name, rows)
+
+            process_files_in_pool(csv_files, self.process_sample, self.store_sample, self.on_error, max_workers,
+                                  on_progress=on_progress)
+            return
+
+        for filename in csv_files:
+            sample_name = sample_name_for(filename)
+            with registry.lock:
+                registry.status[sample_name] = 'Processing'
+            registry.progress.start(sample_name, estimate_rows(filename))
+            try:
+                progress = lambda rows, sample_name=sample_name: registry.progress.advance(sample_name, rows)
+                self.store_sample(sample_name, *self.process_sample(filename, progress=progress))
+            except Exception as e:
+                self.on_error(sample_name, filename, e)
+
+    def load_cached_samples(self, csv_files):
+        """Load every file whose counts are already cached, skipping the manual POST."""
+        for filename in csv_files:
+            if os.path.exists(filename):
+                self.load_cached_sample(filename)
+
+    def load_cached_sample(self, filename):
+        # True if the file was loaded from the result cache, or failed trying
+        sample_name = sample_name_for(filename)
+        try:
+            result = self.load_cached(filename)
+        except Exception as e:
+            self.on_error(sample_name, filename, e)
+            return True
+        if result is None:
+            return False
+        registry.add_files([filename])
+        with registry.lock:
+            registry.status[sample_name] = 'Processing'
+        registry.progress.start(sample_name, result[2]['rows'])
+        registry.progress.advance(sample_name, result[2]['rows'])
+        self.store_sample(sample_name, *result)
+        return True
+
+    def queue_samples(self, csv_files):
+        # mark files as waiting, so the status page keeps following them until all are done
+        with registry.lock:
+            for filename in csv_files:
+                registry.status[sample_name_for(filename)] = 'Queued'
+        for filename in csv_files:
+            registry.progress.queue(sample_name_for(filename))
+
+    def store_sample(self, sample_name, output_data, elapsed_time, *rest):
+        self.add_sample(sample_name, output_data, elapsed_time, *rest)
+        with registry.lock:
+            registry.status[sample_name] = 'Completed'
+        registry.progress.finish(sample_name)
+        print(f"Completed processing {sample_name} in {elapsed_time:.2f} seconds")
+        if self.on_completed is not None:
+            self.on_completed(sample_name)
+
+    def on_error(self, sample_name, filename, e):
+        with registry.lock:
+            registry.status[sample_name] = f'Error: {e}'
+        registry.progress.finish(sample_name, f'Error: {e}')
+        print(f"Error processing {filename}: {e}")
+
+
+def open_cached(result_cache, filename, engines):
+    """(SampleStore per engine, elapsed time, metrics) of a file cached for every engine, or None on a miss."""
+    start_time = time.time()
+    metrics = ProcessingMetrics()
+    stores = []
+    with metrics.stage('cache_load'):
+        for engine in engines:
+            store = result_cache.open(filename, engine) if result_cache is not None else None
+            if store is None:
+                for opened in stores:
+                    opened.close()
+                return None
+            stores.append(store)
+    metrics.rows = int(stores[0].columns['gene_rows'].sum())
+    metrics.codons = int(stores[0].columns['count'].sum())
+    return stores, time.time() - start_time, metrics.finish().as_dict()
+
+
+def register_processing_routes(bp, pipeline):
+    """Add the live progress stream and the Prometheus metrics of a view to its blueprint."""
+    processing_metrics = registry.view(pipeline).metrics
+
+    @bp.route("/progress/stream")
+    def progress_stream():
+        # server-sent events with every sample's rows, throughput and ETA
+        return Response(
+            stream_with_context(registry.progress.events()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache'}
+        )
+
+    @bp.route("/metrics")
+    def metrics_page():
+        with registry.lock:
+            metrics = {sample_name: m for sample_name, m in processing_metrics.items() if m}
+        return render_prometheus(metrics, pipeline), 200, {'Content-Type': 'text/plain; version=0.0.4'}
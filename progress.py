@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+
+from readers import is_plain_csv
+
+# bytes read from the start of a file to estimate its row count
+SAMPLE_BYTES = 1 << 20
+
+# status page script: live progress per <span id="progress-SAMPLE"> from the progress_stream
+# endpoint, with a single reload once the samples it saw running are done
+PROGRESS_TEMPLATE = """
+    <script>
+        const progressSource = new EventSource("{{ url_for('.progress_stream') }}");
+        let sawRunning = false;
+        progressSource.onmessage = function(event) {
+            const samples = JSON.parse(event.data);
+            let running = false;
+            for (const [sampleName, progress] of Object.entries(samples)) {
+                if (progress.status === 'Queued' || progress.active) {
+                    running = true;
+                }
+                const item = document.getElementById('progress-' + sampleName);
+                if (!item || !progress.active) {
+                    continue;
+                }
+                let text = ` - ${progress.rows.toLocaleString()}`;
+                if (progress.total_rows) {
+                    text += ` of ~${progress.total_rows.toLocaleString()}`;
+                }
+                text += ` rows, ${Math.round(progress.rows_per_second).toLocaleString()} rows/s`;
+                if (progress.eta_seconds !== null) {
+                    text += `, ETA ${progress.eta_seconds.toFixed(0)} s`;
+                }
+                item.textContent = text;
+            }
+            if (running) {
+                sawRunning = true;
+            } else if (sawRunning) {
+                progressSource.close();
+                window.location.reload();
+            }
+        };
+    </script>
+"""
+
+
+def estimate_rows(filename):
+    """Estimate the data rows of a CSV from the newlines in its first SAMPLE_BYTES (None if unknown)."""
+    if not is_plain_csv(filename):
+        return None
+    try:
+        size = os.path.getsize(filename)
+        with open(filename, 'rb') as file:
+            head = file.read(SAMPLE_BYTES)
+    except OSError:
+        return None
+    lines = head.count(b'\n')
+    if not lines:
+        return None
+    if len(head) == size:
+        rows = lines if head.endswith(b'\n') else lines + 1
+        return max(rows - 1, 0)
+    return max(int(size * lines / len(head)) - 1, 0)
+
+
+class ProgressBroker:
+    """Latest progress of every sample, pushed to listeners when it changes.
+
+    Producers call start/advance/finish from processing threads; listeners
+    block on a condition variable of their own instead of polling the
+    pipeline's data lock. Every change bumps a version number, so a
+    listener only wakes up for states it has not seen yet.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._version = 0
+        self._samples = {}
+
+    def _publish(self, sample_name, **fields):
+        # callers hold self._condition
+        entry = self._samples.setdefault(sample_name, {})
+        entry.update(fields)
+        self._version += 1
+        self._condition.notify_all()
+
+    def queue(self, sample_name):
+        with self._condition:
+            self._publish(sample_name, status='Queued', active=False, rows=0, total_rows=None, eta_seconds=None)
+
+    def start(self, sample_name, total_rows=None, status='Processing'):
+        with self._condition:
+            self._publish(
+                sample_name, status=status, active=True, rows=0, total_rows=total_rows,
+                started=time.perf_counter(), elapsed_seconds=0.0, rows_per_second=0.0, eta_seconds=None,
+            )
+
+    def start_queued(self, sample_name, total_rows=None, status='Processing'):
+        """Start a sample if it is still queued; False if it already started or finished."""
+        with self._condition:  # an RLock, so start can take it again
+            if self._samples.get(sample_name, {}).get('status') != 'Queued':
+                return False
+            self.start(sample_name, total_rows, status)
+            return True
+
+    def advance(self, sample_name, rows):
+        """Record rows more rows processed for a sample and refresh its throughput and ETA."""
+        with self._condition:
+            entry = self._samples.get(sample_name)
+            if entry is None or not entry['active']:
+                return
+            processed = entry['rows'] + rows
+            elapsed = time.perf_counter() - entry['started']
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            total = entry['total_rows']
+            if total is not None and processed > total:
+                total = processed
+            eta = (total - processed) / rate if total is not None and rate > 0 else None
+            self._publish(
+                sample_name, rows=processed, total_rows=total, elapsed_seconds=elapsed,
+                rows_per_second=rate, eta_seconds=eta,
+            )
+
+    def finish(self, sample_name, status='Completed'):
+        with self._condition:
+            entry = self._samples.get(sample_name, {})
+            started = entry.get('started', time.perf_counter())
+            self._publish(
+                sample_name, status=status, active=False, started=started,
+                elapsed_seconds=time.perf_counter() - started,
+                eta_seconds=0.0 if status == 'Completed' else None,
+                rows=entry.get('rows', 0), total_rows=entry.get('total_rows'),
+            )
+
+    def snapshot(self):
+        """(version, {sample: progress}) with the internal start times left out."""
+        with self._condition:
+            return self._version, {
+                sample_name: {key: value for key, value in entry.items() if key != 'started'}
+                for sample_name, entry in self._samples.items()
+            }
+
+    def wait(self, version, timeout=None):
+        """Block until the version moves past version (or timeout); return the new snapshot."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != version, timeout)
+        return self.snapshot()
+
+    def events(self, keepalive=15):
+        """Server-sent events: the full snapshot on connect and after every change."""
+        version, samples = self.snapshot()
+        yield f"data: {json.dumps(samples)}\n\n"
+        while True:
+            new_version, samples = self.wait(version, keepalive)
+            if new_version == version:
+                yield ": keepalive\n\n"
+                continue
+            version = new_version
+            yield f"data: {json.dumps(samples)}\n\n"
@@ -0,0 +1,191 @@
+import csv
+import gzip
+import io
+import os
+import queue
+import re
+import threading
+from itertools import islice
+
+# decompressed bytes handed from the decompression thread to the reader at a time
+BLOCK_SIZE = 1 << 20
+
+# decompressed blocks buffered ahead of the reader; bounds the memory a fast decompressor can use
+PREFETCH_BLOCKS = 8
+
+# file name suffixes of each input format; any of them may be followed by .gz
+FORMAT_SUFFIXES = {
+    'csv': ('.csv',),
+    'fasta': ('.fa', '.fasta', '.fna'),
+    'fastq': ('.fq', '.fastq'),
+}
+
+# header fields naming the gene, e.g. ">read17 gene=Xkr4" or "@read17 gene_name:Xkr4"
+_GENE_FIELD = re.compile(r'(?:^|\s)(?:gene_name|gene)[=:](\S+)')
+
+
+def input_format(filename):
+    """(format, compressed) of an input file from its name; unknown suffixes are read as CSV."""
+    name = os.path.basename(filename).lower()
+    compressed = name.endswith('.gz')
+    if compressed:
+        name = name[:-3]
+    for input_type, suffixes in FORMAT_SUFFIXES.items():
+        if name.endswith(suffixes):
+            return input_type, compressed
+    return 'csv', compressed
+
+
+def is_plain_csv(filename):
+    """Whether filename is an uncompressed CSV, the only input that can be split by byte range."""
+    return input_format(filename) == ('csv', False)
+
+
+def is_input_file(filename):
+    """Whether filename has the suffix of a supported input, optionally gzipped."""
+    name = filename.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return name.endswith(tuple(suffix for suffixes in FORMAT_SUFFIXES.values() for suffix in suffixes))
+
+
+def sample_name(filename):
+    """File name without its directory, .gz and format suffix."""
+    name = os.path.basename(filename)
+    if name.lower().endswith('.gz'):
+        name = name[:-3]
+    return os.path.splitext(name)[0]
+
+
+class ThreadedDecompressor(io.RawIOBase):
+    """Binary stream of a gzip file's content, inflated on a background thread.
+
+    The thread decompresses BLOCK_SIZE blocks into a bounded queue while
+    the reader parses and counts earlier ones; zlib releases the GIL, so
+    both run at once and no decompressed copy is written to disk.
+    Decompression errors are raised in the reader.
+    """
+
+    def __init__(self, filename, block_size=BLOCK_SIZE, prefetch=PREFETCH_BLOCKS):
+        self._blocks = queue.Queue(maxsize=prefetch)
+        self._pending = memoryview(b'')
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decompress, args=(filename, block_size), daemon=True)
+        self._thread.start()
+
+    def _decompress(self, filename, block_size):
+        try:
+            with gzip.open(filename, 'rb') as file:
+                for block in iter(lambda: file.read(block_size), b''):
+                    if not self._put(block):
+                        return
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(b'')
+
+    def _put(self, item):
+        # False once the reader is closed, so an abandoned stream does not keep its thread blocked
+        while not self._stop.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._pending:
+            if self._eof:
+                return 0
+            block = self._blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                self._eof = True
+                return 0
+            self._pending = memoryview(block)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self):
+        self._stop.set()
+        super().close()
+
+
+def open_binary(filename):
+    """Binary stream of an input's content; gzip files are decompressed on a separate thread."""
+    if input_format(filename)[1]:
+        return io.BufferedReader(ThreadedDecompressor(filename), BLOCK_SIZE)
+    return open(filename, 'rb')
+
+
+def header_gene(header):
+    """Gene of a FASTA/FASTQ header: its gene= (gene_name=, gene:) field, else its first word."""
+    match = _GENE_FIELD.search(header)
+    if match:
+        return match.group(1)
+    words = header.split()
+    return words[0] if words else ''
+
+
+def csv_records(file):
+    for row in csv.DictReader(file):
+        yield row['gene_name'], row['sequence']
+
+
+def fasta_records(file):
+    # sequences may span several lines
+    gene_name, parts = None, []
+    for line in file:
+        if line.startswith('>'):
+            if gene_name is not None:
+                yield gene_name, ''.join(parts)
+            gene_name, parts = header_gene(line[1:]), []
+        elif gene_name is not None:
+            parts.append(line.strip())
+    if gene_name is not None:
+        yield gene_name, ''.join(parts)
+
+
+def fastq_records(file):
+    # four lines per read: @header, sequence, +, quality
+    for header in file:
+        if not header.strip():
+            continue
+        if not header.startswith('@'):
+            raise ValueError(f"Malformed FASTQ record header: {header.strip()!r}")
+        sequence = next(file, '')
+        next(file, '')
+        next(file, '')
+        yield header_gene(header[1:]), sequence.strip()
+
+
+RECORD_READERS = {
+    'csv': csv_records,
+    'fasta': fasta_records,
+    'fastq': fastq_records,
+}
+
+
+def iter_batches(filename, batch_size):
+    """Raw gene_name and sequence fields of any supported input, batch_size records at a time.
+
+    CSV fields are read as csv.DictReader returns them; FASTA and FASTQ
+    records take their gene from the header (see header_gene).
+    """
+    input_type, _ = input_format(filename)
+    with io.TextIOWrapper(open_binary(filename), encoding='utf-8') as file:
+        records = RECORD_READERS[input_type](file)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                return
+            gene_names, sequences = zip(*batch)
+            yield list(gene_names), list(sequences)
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+
+from sample_store import SampleStore, write_sample
+
+# bump whenever counting or parsing changes, so stale cache entries are ignored
+PIPELINE_VERSION = 2
+
+CACHE_DIR = "cache"
+
+
+def fingerprint(filename, content_hash=False):
+    """Describe an input file by path, size and mtime, or by size and SHA-256 of its content."""
+    stat = os.stat(filename)
+    if not content_hash:
+        return {
+            'path': os.path.abspath(filename),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return {'size': stat.st_size, 'sha256': digest.hexdigest()}
+
+
+class ResultCache:
+    """On-disk cache of per-sample counts keyed by input fingerprint.
+
+    The key combines the file fingerprint, the engine whose parsing rules
+    produced the counts ('hash_map' or 'max_heap') and PIPELINE_VERSION,
+    so any change to the input or the pipeline misses the cache. Entries
+    are sample_store files, so a hit is memory-mapped instead of parsed.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, content_hash=False):
+        self.cache_dir = cache_dir
+        self.content_hash = content_hash
+
+    def key(self, filename, engine):
+        payload = {
+            'fingerprint': fingerprint(filename, self.content_hash),
+            'engine': engine,
+            'version': PIPELINE_VERSION,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path(self, filename, engine):
+        return os.path.join(self.cache_dir, f"{self.key(filename, engine)}.smp")
+
+    def open(self, filename, engine):
+        """Return the cached SampleStore for filename, or None on a miss."""
+        try:
+            path = self.path(filename, engine)
+        except OSError:
+            return None
+        if not os.path.exists(path):
+            return None
+        return SampleStore(path)
+
+    def load(self, filename, engine):
+        """Return the cached counts for filename as a CodonMatrix, or None on a miss."""
+        store = self.open(filename, engine)
+        if store is None:
+            return None
+        with store:
+            return store.to_matrix()
+
+    def store(self, filename, engine, matrix):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return write_sample(self.path(filename, engine), matrix)
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+class SampleIndex:
+    """Pre-grouped drill-down index over a sample's output rows.
+
+    levels names the three drill-down columns, e.g. gene_name -> amino_acid
+    -> codon. Each level is grouped once by (parent value, value), where the
+    parent is the previous level's column: rows are sorted by the pair, and
+    the groups of one parent form a contiguous range found through an
+    offsets array. The first two levels are sized by row count and the last
+    level by the sum of size_col, so every drill-down is a slice lookup
+    returning the same groups as a pandas groupby on the filtered rows.
+    """
+
+    def __init__(self, rows, levels=("gene_name", "amino_acid", "codon"), size_col="usage_rate"):
+        names = {}
+        codes = {}
+        for level in levels:
+            level_names, level_codes = np.unique(np.array([str(row[level]) for row in rows]), return_inverse=True)
+            names[level] = level_names.tolist()
+            codes[level] = level_codes.reshape(-1)
+        self._build(levels, names, codes, np.array([float(row[size_col]) for row in rows], dtype=np.float64))
+
+    @classmethod
+    def from_codes(cls, levels, names, codes, sizes):
+        """Index rows already given as columns: per level, sorted unique names and each row's position in them."""
+        index = cls.__new__(cls)
+        index._build(levels, names, codes, np.asarray(sizes, dtype=np.float64))
+        return index
+
+    def _build(self, levels, names, codes, sizes):
+        self.levels = levels
+        self.row_count = len(sizes)
+        self._names = names
+        self._codes = codes
+
+        self._groups = {}
+        for depth, level in enumerate(levels):
+            use_sum = depth == len(levels) - 1
+            self._groups[(level, None)] = self._group(None, level, sizes, use_sum)
+            if depth > 0:
+                self._groups[(level, levels[depth - 1])] = self._group(levels[depth - 1], level, sizes, use_sum)
+
+    def _group(self, parent_level, level, sizes, use_sum):
+        """Aggregate rows by (parent, value): returns per-parent offsets, value ids and sizes."""
+        codes = self._codes[level]
+        parents = self._codes[parent_level] if parent_level else np.zeros(len(codes), dtype=np.int64)
+        order = np.lexsort((codes, parents))
+        pairs = parents[order] * len(self._names[level]) + codes[order]
+        starts = np.flatnonzero(np.r_[True, pairs[1:] != pairs[:-1]]) if len(pairs) else np.zeros(0, dtype=np.int64)
+
+        group_parents = parents[order][starts]
+        group_values = codes[order][starts]
+        if use_sum:
+            group_sizes = np.add.reduceat(sizes[order], starts) if len(starts) else np.zeros(0)
+        else:
+            group_sizes = np.diff(np.r_[starts, len(pairs)])
+
+        parent_count = len(self._names[parent_level]) if parent_level else 1
+        offsets = np.searchsorted(group_parents, np.arange(parent_count + 1))
+        return offsets, group_values, group_sizes
+
+    def group(self, level, parent_name=None):
+        """(names, sizes) of the circles at level under parent_name, or None if empty.
+
+        The first level ignores parent_name; deeper levels without a parent
+        group the whole sample.
+        """
+        if level not in self._names:
+            return None
+        depth = self.levels.index(level)
+        parent_level = self.levels[depth - 1] if depth > 0 and parent_name is not None else None
+        offsets, values, sizes = self._groups[(level, parent_level)]
+
+        parent = 0
+        if parent_level is not None:
+            parent_names = self._names[parent_level]
+            parent = np.searchsorted(parent_names, str(parent_name))
+            if parent == len(parent_names) or parent_names[parent] != str(parent_name):
+                return None
+        start, end = offsets[parent], offsets[parent + 1]
+        if start == end:
+            return None
+        names = self._names[level]
+        return [names[value] for value in values[start:end].tolist()], sizes[start:end].tolist()
@@ -0,0 +1,62 @@
+import threading
+
+from progress import ProgressBroker
+from readers import sample_name
+
+
+class SampleView:
+    """Per-sample data one view serves: output rows, drill-down indexes, timings, metrics, usage profiles and CAI scores.
+
+    A sample loaded from the result cache keeps its memory-mapped
+    SampleStore in data instead of output rows.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.indexes = {}
+        self.times = {}
+        self.metrics = {}
+        self.profiles = {}
+        self.adaptations = {}
+
+
+class SampleRegistry:
+    """Samples loaded into one server process, shared by every view mounted in it.
+
+    Processing status, live progress and the input file a sample was read
+    from are kept once per sample; each view ('hash_map', 'max_heap')
+    keeps its own SampleView. A server that
+    fills several views from one pass over each file sets ingest to a
+    function taking the list of CSV files, and the views start processing
+    through it instead of their own pipelines. Likewise it sets append to
+    a function taking (sample name, file of new rows) that appends to
+    every view, and the append page calls it instead of its own view's.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.status = {}
+        self.files = {}
+        self.progress = ProgressBroker()
+        self.views = {}
+        self.ingest = None
+        self.append = None
+
+    def view(self, name):
+        with self.lock:
+            return self.views.setdefault(name, SampleView())
+
+    def add_files(self, csv_files):
+        """Record the input file of every sample about to be ingested from csv_files."""
+        with self.lock:
+            for filename in csv_files:
+                self.files[sample_name(filename)] = filename
+
+    def filename(self, sample_name):
+        """Input file a sample was ingested from, or None if it never was."""
+        with self.lock:
+            return self.files.get(sample_name)
+
+
+# registry of this process; the visual apps and the unified server all use it
+registry = SampleRegistry()
@@ -0,0 +1,315 @@
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+from codon_index import CODONS
+from codon_matrix import AMINO_ACIDS, CODON_AMINO_ACID, NEVER, CodonMatrix
+from sample_index import SampleIndex
+
+# File layout (little-endian, every section starts on an 8-byte boundary):
+#   header            magic, version, genes, amino acids, rows, gene name bytes
+#   gene_offsets      uint64[genes + 1]  offsets into the gene name blob
+#   gene_blob         utf-8 gene names
+#   amino_acid_table  one byte per amino acid
+#   codon_table       three bytes per codon, in CODONS order
+#   gene_rows         int64[genes]       sequences per gene
+#   gene_first_seen   int64[genes]       first-seen ordinal of the gene's first codon
+#   genome_optimal    uint8[amino acids] genome-wide optimal codon id (255 if none)
+#   row columns       gene_id uint32, amino_acid_id uint8, codon_id uint8,
+#                     count int64, first_seen int64, usage float64
+# Rows are the non-zero (gene, codon) cells, sorted by gene id, then amino
+# acid and codon in first-seen order, so each gene and each (gene, amino
+# acid) group is a contiguous range.
+MAGIC = b'CODONSMP'
+VERSION = 1
+_HEADER = struct.Struct('<8sIIIQQ')
+_NO_CODON = 255
+
+_ROW_COLUMNS = [
+    ('gene_id', np.uint32),
+    ('amino_acid_id', np.uint8),
+    ('codon_id', np.uint8),
+    ('count', np.int64),
+    ('first_seen', np.int64),
+    ('usage', np.float64),
+]
+
+
+def _padded(size):
+    return (size + 7) & ~7
+
+
+def _ranked(labels, ids):
+    """(sorted labels of the ids present, each id's position among them), as SampleIndex levels use."""
+    present = np.unique(ids).tolist()
+    names = sorted(labels[i] for i in present)
+    rank = {name: position for position, name in enumerate(names)}
+    positions = np.zeros(len(labels), dtype=np.int64)
+    positions[present] = [rank[labels[i]] for i in present]
+    return names, positions[ids]
+
+
+def _sections(genes, amino_acids, rows, blob_bytes):
+    """(name, dtype, length) of every section after the header, in file order."""
+    sections = [
+        ('gene_offsets', np.uint64, genes + 1),
+        ('gene_blob', np.uint8, blob_bytes),
+        ('amino_acid_table', np.uint8, amino_acids),
+        ('codon_table', np.uint8, 3 * len(CODONS)),
+        ('gene_rows', np.int64, genes),
+        ('gene_first_seen', np.int64, genes),
+        ('genome_optimal', np.uint8, amino_acids),
+    ]
+    return sections + [(name, dtype, rows) for name, dtype in _ROW_COLUMNS]
+
+
+def write_sample(path, matrix):
+    """Write a CodonMatrix to path in the binary sample format.
+
+    The file is written to a temporary name and moved into place, so
+    readers never see a partial file.
+    """
+    counts = matrix.counts
+    first_seen = matrix.first_seen
+    gene_ids, codon_ids = np.nonzero(counts)
+    amino_acid_ids = CODON_AMINO_ACID[codon_ids]
+    cell_first_seen = first_seen[gene_ids, codon_ids]
+
+    # order each gene's amino acids by their first codon, then codons by first appearance
+    group_first_seen = np.full((len(matrix), len(AMINO_ACIDS)), NEVER, dtype=np.int64)
+    np.minimum.at(group_first_seen, (gene_ids, amino_acid_ids), cell_first_seen)
+    order = np.lexsort((cell_first_seen, group_first_seen[gene_ids, amino_acid_ids], gene_ids))
+
+    names = [gene_name.encode('utf-8') for gene_name in matrix.gene_names]
+    gene_offsets = np.zeros(len(names) + 1, dtype=np.uint64)
+    np.cumsum([len(name) for name in names], out=gene_offsets[1:])
+
+    genome_optimal = np.full(len(AMINO_ACIDS), _NO_CODON, dtype=np.uint8)
+    for amino_acid, codon in matrix.aggregate_optimality().items():
+        genome_optimal[AMINO_ACIDS.index(amino_acid)] = CODONS.index(codon)
+
+    data = {
+        'gene_offsets': gene_offsets,
+        'gene_blob': np.frombuffer(b''.join(names), dtype=np.uint8),
+        'amino_acid_table': np.frombuffer(''.join(AMINO_ACIDS).encode('ascii'), dtype=np.uint8),
+        'codon_table': np.frombuffer(''.join(CODONS).encode('ascii'), dtype=np.uint8),
+        'gene_rows': matrix.gene_rows,
+        'gene_first_seen': first_seen.min(axis=1) if len(matrix) else np.zeros(0, dtype=np.int64),
+        'genome_optimal': genome_optimal,
+        'gene_id': gene_ids[order],
+        'amino_acid_id': amino_acid_ids[order],
+        'codon_id': codon_ids[order],
+        'count': counts[gene_ids, codon_ids][order],
+        'first_seen': cell_first_seen[order],
+        'usage': matrix.calculate_usage_rates()[gene_ids, codon_ids][order],
+    }
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as file:
+        header = _HEADER.pack(MAGIC, VERSION, len(names), len(AMINO_ACIDS), len(order), len(data['gene_blob']))
+        file.write(header.ljust(_padded(len(header)), b'\0'))
+        for name, dtype, length in _sections(len(names), len(AMINO_ACIDS), len(order), len(data['gene_blob'])):
+            raw = np.ascontiguousarray(data[name], dtype=dtype).tobytes()
+            assert len(raw) == length * np.dtype(dtype).itemsize
+            file.write(raw.ljust(_padded(len(raw)), b'\0'))
+    os.replace(temp_path, path)
+    return path
+
+
+class SampleStore:
+    """Read-only, memory-mapped view of a sample written by write_sample.
+
+    Columns are NumPy arrays over the mapping, so opening a store copies
+    nothing, and every process that opens the same file shares one copy in
+    the page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, genes, amino_acids, rows, blob_bytes = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {VERSION} sample store")
+
+        self.columns = {}
+        offset = _padded(_HEADER.size)
+        for name, dtype, length in _sections(genes, amino_acids, rows, blob_bytes):
+            self.columns[name] = np.frombuffer(self._mmap, dtype=dtype, count=length, offset=offset)
+            offset += _padded(length * np.dtype(dtype).itemsize)
+
+        self.amino_acids = list(bytes(self.columns['amino_acid_table']).decode('ascii'))
+        codon_table = bytes(self.columns['codon_table']).decode('ascii')
+        self.codons = [codon_table[i:i + 3] for i in range(0, len(codon_table), 3)]
+        self._gene_names = None
+
+        # row range of each gene: rows are sorted by gene id
+        self.gene_starts = np.searchsorted(self.columns['gene_id'], np.arange(genes + 1))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.columns['gene_rows'])
+
+    def close(self):
+        # drop our array views before unmapping; if callers still hold
+        # columns, the mapping is released once they are garbage collected
+        self.columns = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    @property
+    def gene_names(self):
+        if self._gene_names is None:
+            blob = bytes(self.columns['gene_blob'])
+            offsets = self.columns['gene_offsets'].tolist()
+            self._gene_names = [blob[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+        return self._gene_names
+
+    def genome_optimality(self):
+        """Genome-wide optimal codon per amino acid, as from aggregate_optimality."""
+        return {
+            self.amino_acids[group]: self.codons[codon]
+            for group, codon in enumerate(self.columns['genome_optimal'].tolist())
+            if codon != _NO_CODON
+        }
+
+    def codon_totals(self):
+        """Counts of every codon summed over all genes, shape (64,)."""
+        totals = np.zeros(len(CODONS), dtype=np.int64)
+        np.add.at(totals, self.columns['codon_id'], self.columns['count'])
+        return totals
+
+    def _gene_groups(self, gene):
+        """(amino acid id, row range) groups of a gene, in first-seen order."""
+        start, end = int(self.gene_starts[gene]), int(self.gene_starts[gene + 1])
+        amino_acid_ids = self.columns['amino_acid_id'][start:end].tolist()
+        groups = []
+        for offset, amino_acid_id in enumerate(amino_acid_ids):
+            if not groups or groups[-1][0] != amino_acid_id:
+                groups.append((amino_acid_id, start + offset, start + offset + 1))
+            else:
+                groups[-1] = (amino_acid_id, groups[-1][1], start + offset + 1)
+        return groups
+
+    def hash_map_rows(self):
+        """Output rows of hash_map_visuals.process_file, read straight from the store."""
+        gene_names = self.gene_names
+        genome_optimal = self.genome_optimality()
+        amino_acids = [self.amino_acids[group] for group in self.columns['amino_acid_id'].tolist()]
+        codons = [self.codons[codon] for codon in self.columns['codon_id'].tolist()]
+        usage = self.columns['usage'].tolist()
+
+        with_rows = np.flatnonzero(np.diff(self.gene_starts))
+        gene_order = with_rows[np.argsort(self.columns['gene_first_seen'][with_rows], kind='stable')]
+        output_data = []
+        for gene in gene_order.tolist():
+            gene_name = gene_names[gene]
+            for row in range(int(self.gene_starts[gene]), int(self.gene_starts[gene + 1])):
+                output_data.append({
+                    'gene_name': gene_name,
+                    'amino_acid': amino_acids[row],
+                    'optimal_codon': genome_optimal.get(amino_acids[row]),
+                    'codon': codons[row],
+                    'usage_rate': usage[row]
+                })
+        return output_data
+
+    def hash_map_index(self):
+        """SampleIndex of the hash_map_rows output, built on the mapped columns without making the rows."""
+        gene_ids = self.columns['gene_id']
+        gene_order = np.zeros(len(self), dtype=np.int64)
+        gene_order[np.argsort(self.columns['gene_first_seen'], kind='stable')] = np.arange(len(self))
+        # rows in hash_map_rows order, so the summed sizes match its rows to the last bit
+        order = np.argsort(gene_order[gene_ids], kind='stable')
+        return self._index(
+            ("gene_name", "amino_acid", "codon"), order,
+            [self.gene_names, self.amino_acids, self.codons], self.columns['usage'][order],
+        )
+
+    def max_heap_index(self):
+        """SampleIndex of the max_heap_rows output, built on the mapped columns without making the rows."""
+        counts = self.columns['count']
+        best = np.zeros(0, dtype=np.int64)
+        if len(counts):
+            gene_ids = self.columns['gene_id']
+            amino_acid_ids = self.columns['amino_acid_id']
+            changes = (gene_ids[1:] != gene_ids[:-1]) | (amino_acid_ids[1:] != amino_acid_ids[:-1])
+            starts = np.flatnonzero(np.r_[True, changes])
+            # first row of each (gene, amino acid) group with the group's highest count
+            group_best = np.repeat(np.maximum.reduceat(counts, starts), np.diff(np.r_[starts, len(counts)]))
+            best = np.minimum.reduceat(np.where(counts == group_best, np.arange(len(counts)), len(counts)), starts)
+        usage = np.char.mod('%.4f', self.columns['usage'][best]).astype(np.float64)
+        return self._index(
+            ("gene_name", "amino_acid", "optimal_codon"), best,
+            [self.gene_names, self.amino_acids, self.codons], usage,
+        )
+
+    def _index(self, levels, rows, labels, sizes):
+        # SampleIndex over the given rows; labels map the gene, amino acid and codon id columns to level names
+        names = {}
+        codes = {}
+        for level, level_labels, column in zip(levels, labels, ('gene_id', 'amino_acid_id', 'codon_id')):
+            names[level], codes[level] = _ranked(level_labels, self.columns[column][rows])
+        return SampleIndex.from_codes(levels, names, codes, sizes)
+
+    def max_heap_rows(self):
+        """Output rows of max_heap.process_file: the per-gene optimal codon of each amino acid.
+
+        Within a (gene, amino acid) group rows are in first-seen order, so
+        the first row with the highest count is the codon the MaxHeap yields.
+        """
+        gene_names = self.gene_names
+        counts = self.columns['count'].tolist()
+        codon_ids = self.columns['codon_id'].tolist()
+        usage = self.columns['usage'].tolist()
+        output_data = []
+        for gene in range(len(self)):
+            for amino_acid_id, start, end in self._gene_groups(gene):
+                best = max(range(start, end), key=lambda row: counts[row])
+                output_data.append({
+                    'gene_name': gene_names[gene],
+                    'amino_acid': self.amino_acids[amino_acid_id],
+                    'optimal_codon': self.codons[codon_ids[best]],
+                    'usage_rate': f"{usage[best]:.4f}"
+                })
+        return output_data
+
+    def to_matrix(self):
+        """Rebuild the CodonMatrix the store was written from."""
+        gene_names = self.gene_names
+        matrix = CodonMatrix(capacity=max(len(gene_names), 1))
+        matrix.gene_names = list(gene_names)
+        matrix.gene_index = {gene_name: row for row, gene_name in enumerate(gene_names)}
+        gene_ids = self.columns['gene_id'].astype(np.int64)
+        codon_ids = self.columns['codon_id'].astype(np.int64)
+        matrix.counts[gene_ids, codon_ids] = self.columns['count']
+        matrix.first_seen[gene_ids, codon_ids] = self.columns['first_seen']
+        matrix.gene_rows[:] = self.columns['gene_rows']
+        first_seen = self.columns['first_seen']
+        matrix.clock = int(first_seen.max()) + 1 if len(first_seen) else 0
+        return matrix
+
+
+def main():
+    # print a summary of each sample store given on the command line
+    for path in sys.argv[1:]:
+        with SampleStore(path) as store:
+            print(f"{path}: {len(store)} genes, {len(store.columns['count'])} codon rows, "
+                  f"{int(store.columns['gene_rows'].sum())} sequences")
+            for amino_acid, codon in sorted(store.genome_optimality().items()):
+                print(f"  {amino_acid}: {codon}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+from codon_matrix import CodonMatrix
+from hash_map import iter_csv_chunks
+from readers import is_plain_csv, iter_batches
+
+# rows translated at a time inside a shard
+BATCH_SIZE = 10000
+
+
+class _ShardFile(io.RawIOBase):
+    """Read-only view of a CSV byte range with the file's header line in front."""
+
+    def __init__(self, filename, start, end):
+        self._file = open(filename, 'rb')
+        self._pending = self._file.readline()
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._pending:
+            size = min(len(buffer), len(self._pending))
+            buffer[:size] = self._pending[:size]
+            self._pending = self._pending[size:]
+            return size
+        data = self._file.read(min(len(buffer), self._remaining))
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def shard_ranges(filename, shards):
+    """Split a CSV into at most shards byte ranges, each starting on a line boundary.
+
+    The header line is excluded from every range.
+    """
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as file:
+        header_end = len(file.readline())
+        boundaries = [header_end]
+        for shard in range(1, shards):
+            position = header_end + (size - header_end) * shard // shards
+            if position <= boundaries[-1]:
+                continue
+            file.seek(position - 1)
+            file.readline()
+            position = file.tell()
+            if boundaries[-1] < position < size:
+                boundaries.append(position)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def count_shard(filename, start, end, clean=True):
+    """Count the codons of one byte range of a CSV into a CodonMatrix.
+
+    clean=True parses the range like hash_map (pandas, stripped and
+    upper-cased fields); clean=False reads raw fields with csv.DictReader
+    like max_heap. The matrix clock starts at the range's byte offset, which
+    keeps first-seen ordinals of different shards in file order.
+    """
+    matrix = CodonMatrix(clock=start)
+    with io.BufferedReader(_ShardFile(filename, start, end)) as shard:
+        if clean:
+            matrix.add_chunks(iter_csv_chunks(shard, BATCH_SIZE))
+            return matrix
+
+        reader = csv.DictReader(io.TextIOWrapper(shard, encoding='utf-8', newline=''))
+        gene_names, sequences = [], []
+        for row in reader:
+            gene_names.append(row['gene_name'])
+            sequences.append(row['sequence'])
+            if len(gene_names) == BATCH_SIZE:
+                matrix.add_sequences(gene_names, sequences)
+                gene_names, sequences = [], []
+        matrix.add_sequences(gene_names, sequences)
+    return matrix
+
+
+def count_input(filename, clean=True):
+    """Count a whole input of any supported format in this process, like a single shard."""
+    matrix = CodonMatrix()
+    if clean:
+        return matrix.add_chunks(iter_csv_chunks(filename, BATCH_SIZE))
+    for gene_names, sequences in iter_batches(filename, BATCH_SIZE):
+        matrix.add_sequences(gene_names, sequences)
+    return matrix
+
+
+def count_file_sharded(filename, shards, clean=True, max_workers=None):
+    """Count a CSV in shards on separate processes and merge the per-gene counts.
+
+    The merged CodonMatrix holds the same gene counts, codon counts and
+    first-seen order as a serial pass over the file.
+    """
+    if not is_plain_csv(filename):
+        # compressed, FASTA and FASTQ inputs cannot be split by byte range
+        return count_input(filename, clean)
+
+    ranges = shard_ranges(filename, shards)
+    if len(ranges) <= 1:
+        start, end = ranges[0] if ranges else (0, 0)
+        return count_shard(filename, start, end, clean)
+
+    with ProcessPoolExecutor(max_workers=max_workers or len(ranges)) as executor:
+        matrices = executor.map(count_shard, *zip(*[(filename, start, end, clean) for start, end in ranges]))
+        return reduce(CodonMatrix.merge, matrices)
@@ -0,0 +1,137 @@
+import threading
+
+import numpy as np
+
+from codon_index import CODONS
+from codon_matrix import AMINO_ACIDS, CODON_AMINO_ACID
+from differential import AMINO_ACID_ONEHOT, js_divergence
+
+# metric -> whether it is a distance (0 for identical usage) rather than a similarity
+METRICS = {
+    'js_divergence': True,
+    'correlation': False,
+}
+
+# page drawing the similarity matrix of the loaded samples via api_similarity
+SIMILARITY_TEMPLATE = """
+    <button onclick="window.location.href='{{ url_for('.index') }}'">Home</button>
+    <h1>Sample similarity</h1>
+    <form method="get">
+        <select name="metric" onchange="this.form.submit()">
+            {% for name in metrics %}
+                <option value="{{ name }}" {% if name == metric %}selected{% endif %}>{{ name }}</option>
+            {% endfor %}
+        </select>
+    </form>
+    <div id="similarity"></div>
+    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    <script>
+        fetch({{ url_for('.api_similarity', metric=metric)|tojson }})
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    console.error(data.error);
+                    return;
+                }
+                Plotly.newPlot('similarity', [{
+                    z: data.matrix, x: data.samples, y: data.samples, type: 'heatmap',
+                    colorscale: data.distance ? 'Viridis' : 'RdBu', reversescale: data.distance
+                }], {
+                    width: 200 + 40 * data.samples.length, height: 150 + 40 * data.samples.length,
+                    margin: {l: 200, b: 150}, yaxis: {autorange: 'reversed'}
+                });
+            });
+    </script>
+"""
+
+
+def usage_profiles(codon_totals):
+    """(usage rates, amino acid totals) of stacked genome-wide codon counts, shapes (n, 64) and (n, amino acids)."""
+    totals = codon_totals @ AMINO_ACID_ONEHOT
+    usage = np.zeros(codon_totals.shape, dtype=np.float64)
+    np.divide(codon_totals, totals[:, CODON_AMINO_ACID], out=usage, where=totals[:, CODON_AMINO_ACID] > 0)
+    return usage, totals
+
+
+def pairwise(usage1, totals1, usage2, totals2):
+    """{metric: (n1, n2) matrix} between every row of two sets of usage profiles, in one batched pass."""
+    centered1 = usage1 - usage1.mean(axis=1, keepdims=True)
+    centered2 = usage2 - usage2.mean(axis=1, keepdims=True)
+    norms = np.outer(np.linalg.norm(centered1, axis=1), np.linalg.norm(centered2, axis=1))
+    correlation = np.divide(centered1 @ centered2.T, norms, out=np.zeros(norms.shape), where=norms > 0)
+    divergence = js_divergence(usage1[:, None], totals1[:, None], usage2[None], totals2[None])
+    return {'js_divergence': divergence, 'correlation': correlation}
+
+
+class SimilarityCache:
+    """Thread-safe samples x samples matrices over genome-wide codon usage.
+
+    Each sample is represented by its codon counts summed over genes, and
+    every metric in METRICS is kept for every pair of cached samples.
+    Adding samples computes only their rows and columns, against every
+    cached sample in one batched pass; invalidate drops a sample's row and
+    column, so a changed sample is recomputed on its next use.
+    """
+
+    def __init__(self):
+        self.sample_names = []
+        self._usage = np.empty((0, len(CODONS)))
+        self._totals = np.empty((0, len(AMINO_ACIDS)), dtype=np.int64)
+        self._matrices = {metric: np.empty((0, 0)) for metric in METRICS}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sample_names)
+
+    def invalidate(self, sample_name):
+        with self._lock:
+            self._generations[sample_name] = self._generations.get(sample_name, 0) + 1
+            if sample_name not in self.sample_names:
+                return
+            keep = np.arange(len(self.sample_names)) != self.sample_names.index(sample_name)
+            self.sample_names.remove(sample_name)
+            self._usage = self._usage[keep]
+            self._totals = self._totals[keep]
+            self._matrices = {metric: matrix[np.ix_(keep, keep)] for metric, matrix in self._matrices.items()}
+
+    def _add(self, codon_totals):
+        # codon_totals: {sample: (64,) counts} of samples not cached yet
+        usage, totals = usage_profiles(np.array(list(codon_totals.values()), dtype=np.int64))
+        all_usage = np.concatenate([self._usage, usage])
+        all_totals = np.concatenate([self._totals, totals])
+        new_rows = pairwise(usage, totals, all_usage, all_totals)
+        cached = len(self.sample_names)
+        for metric, rows in new_rows.items():
+            matrix = np.empty((len(all_usage), len(all_usage)))
+            matrix[:cached, :cached] = self._matrices[metric]
+            matrix[cached:] = rows
+            matrix[:, cached:] = rows.T
+            self._matrices[metric] = matrix
+        self.sample_names.extend(codon_totals)
+        self._usage = all_usage
+        self._totals = all_totals
+
+    def matrix(self, sample_names, metric, load):
+        """The metric between every pair of sample_names, as a (samples, samples) array.
+
+        load(sample_name) returns the genome-wide codon counts of a sample
+        that is not cached; it runs outside the lock, and counts of a
+        sample invalidated meanwhile are not cached.
+        """
+        while True:
+            with self._lock:
+                missing = [name for name in dict.fromkeys(sample_names) if name not in self.sample_names]
+                if not missing:
+                    rows = [self.sample_names.index(name) for name in sample_names]
+                    return self._matrices[metric][np.ix_(rows, rows)]
+                generations = {name: self._generations.get(name, 0) for name in missing}
+
+            codon_totals = {name: load(name) for name in missing}
+            with self._lock:
+                codon_totals = {
+                    name: totals for name, totals in codon_totals.items()
+                    if name not in self.sample_names and self._generations.get(name, 0) == generations[name]
+                }
+                if codon_totals:
+                    self._add(codon_totals)
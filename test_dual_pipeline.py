@@ -0,0 +1,61 @@
+import csv
+
+import pytest
+
+import dual_pipeline
+import hash_map_visuals
+import max_heap
+from benchmark import generate_csv
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def synthetic_csv(tmp_path):
+    path = tmp_path / "synthetic.csv"
+    generate_csv(path, genes=200, rows_per_gene=10, sequence_length=120, n_rate=0.01, seed=1)
+    return str(path)
+
+
+@pytest.fixture
+def untidy_csv(synthetic_csv, tmp_path):
+    # rows the engines clean differently: padded gene names, lower-case sequences and missing fields
+    with open(synthetic_csv, newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file))
+    for position, row in enumerate(rows[1:], start=1):
+        if position % 7 == 0:
+            row[0] = f" {row[0]} "
+        if position % 11 == 0:
+            row[1] = row[1].lower()
+        if position % 97 == 0:
+            row[1] = "NA"
+    path = tmp_path / "untidy.csv"
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        csv.writer(file).writerows(rows)
+    return str(path)
+
+
+def expected_rows(filename):
+    return (
+        hash_map_visuals.process_file(filename, shards=1, cache=None)[0],
+        max_heap.process_file(filename)[0],
+    )
+
+
+def test_parity_on_synthetic_data(synthetic_csv):
+    assert dual_pipeline.check_parity(synthetic_csv) == {}
+
+
+def test_parity_when_cleaning_forks_the_counts(untidy_csv, monkeypatch):
+    # small batches, so the shared counts fork part-way through the file
+    monkeypatch.setattr(max_heap, 'BATCH_SIZE', 50)
+    hash_map_matrix, max_heap_matrix = dual_pipeline.count_file(untidy_csv)
+    assert hash_map_matrix is not max_heap_matrix
+    assert dual_pipeline.check_parity(untidy_csv) == {}
+
+
+def test_parity_through_the_result_cache(untidy_csv, tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path / "cache"))
+    expected = expected_rows(untidy_csv)
+    for _ in range(2):
+        hash_map_rows, max_heap_rows, _ = dual_pipeline.process_file(untidy_csv, cache=cache)
+        assert (hash_map_rows, max_heap_rows) == expected
@@ -0,0 +1,98 @@
+import numpy as np
+
+from max_heap import MaxHeap
+
+# sample store rows scanned per block when streaming usage rates
+BLOCK_ROWS = 65536
+
+
+def top_k(items, k):
+    """The k (key, value) pairs with the largest values, largest first.
+
+    items is consumed as a stream through a bounded heap that holds the k
+    best pairs seen so far with the weakest on top, so the query runs in
+    O(N log k) time and O(k) memory. Ties keep the pairs that came first.
+    """
+    if k <= 0:
+        return []
+    # heap values are (-value, position): the top is the weakest pair, and the latest among equals
+    heap = MaxHeap()
+    for position, (key, value) in enumerate(items):
+        if len(heap) < k:
+            heap.insert(key, (-value, position))
+        elif -value < heap.peek()[0][0]:
+            heap.replace(key, (-value, position))
+
+    ranked = sorted(zip(heap.values, heap.keys))
+    return [(key, -value) for (value, _), key in ranked]
+
+
+def store_usage(store, amino_acid=None, codon=None):
+    """Stream ((gene, amino acid, codon), usage rate) for every codon row of a SampleStore.
+
+    amino_acid and codon filter the rows; the store is read block by block
+    so only BLOCK_ROWS rows are materialized at a time.
+    """
+    columns = store.columns
+    gene_names = store.gene_names
+    amino_acid_id = store.amino_acids.index(amino_acid) if amino_acid in store.amino_acids else None
+    codon_id = store.codons.index(codon) if codon in store.codons else None
+    if (amino_acid is not None and amino_acid_id is None) or (codon is not None and codon_id is None):
+        return
+
+    for start in range(0, len(columns['usage']), BLOCK_ROWS):
+        end = start + BLOCK_ROWS
+        mask = np.ones(len(columns['usage'][start:end]), dtype=bool)
+        if amino_acid_id is not None:
+            mask &= columns['amino_acid_id'][start:end] == amino_acid_id
+        if codon_id is not None:
+            mask &= columns['codon_id'][start:end] == codon_id
+        rows = np.flatnonzero(mask) + start
+        genes = columns['gene_id'][rows].tolist()
+        amino_acids = columns['amino_acid_id'][rows].tolist()
+        codons = columns['codon_id'][rows].tolist()
+        for gene, group, codon_index, usage in zip(genes, amino_acids, codons, columns['usage'][rows].tolist()):
+            yield (gene_names[gene], store.amino_acids[group], store.codons[codon_index]), usage
+
+
+def top_usage(stores, k, amino_acid=None, codon=None):
+    """Top k genes by usage rate across samples.
+
+    stores maps a sample name to its SampleStore, so every codon of every
+    gene is ranked. Returns result dicts, highest usage first.
+    """
+    def stream():
+        for sample_name, store in stores.items():
+            for (gene_name, group, codon_name), usage in store_usage(store, amino_acid, codon):
+                yield (sample_name, gene_name, group, codon_name), usage
+
+    return [
+        {
+            'sample_name': sample_name,
+            'gene_name': gene_name,
+            'amino_acid': group,
+            'codon': codon_name,
+            'usage_rate': usage
+        }
+        for (sample_name, gene_name, group, codon_name), usage in top_k(stream(), k)
+    ]
+
+
+def top_cai(adaptations, k, lowest=False):
+    """Top k genes by codon adaptation index across samples, or the k lowest.
+
+    adaptations maps a sample name to its cai.CodonAdaptation; genes
+    without a score are skipped. Returns result dicts in rank order.
+    """
+    sign = -1.0 if lowest else 1.0
+
+    def stream():
+        for sample_name, adaptation in adaptations.items():
+            genes = np.flatnonzero(~np.isnan(adaptation.cai))
+            for gene, score in zip(genes.tolist(), (sign * adaptation.cai[genes]).tolist()):
+                yield (sample_name, adaptation.gene_names[gene]), score
+
+    return [
+        {'sample_name': sample_name, 'gene_name': gene_name, 'cai': sign * score}
+        for (sample_name, gene_name), score in top_k(stream(), k)
+    ]